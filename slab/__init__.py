@@ -12,3 +12,5 @@ from slab.psychoacoustics import *
 from slab.binaural import *
 from slab.sound import *
 from slab.signal import *
+from slab.filter import *
+from slab.stream import *
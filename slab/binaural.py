@@ -43,11 +43,13 @@ class Binaural(Sound):
     right = property(fget=lambda self: self.channel(1), fset=_set_right,
                      doc='The right channel for a stereo sound.')
 
-    def __init__(self, data, samplerate=None):
+    def __init__(self, data, samplerate=None, dtype=None, copy=True):
         if isinstance(data, (Sound, Signal)):
             if data.nchannels != 2:
                 data.copychannel(2)
             self.data = data.data
+            if dtype is not None:
+                self.data = self.data.astype(Sound.get_dtype(dtype), copy=False)
             self.samplerate = data.samplerate
         elif isinstance(data, (list, tuple)):
             if isinstance(data[0], (Sound, Signal)):
@@ -55,15 +57,15 @@ class Binaural(Sound):
                     raise ValueError('Sounds must have same number of samples!')
                 if data[0].samplerate != data[1].samplerate:
                     raise ValueError('Sounds must have same samplerate!')
-                super().__init__((data[0].data[:, 0], data[1].data[:, 0]), data[0].samplerate)
+                super().__init__((data[0].data[:, 0], data[1].data[:, 0]), data[0].samplerate, dtype)
             else:
-                super().__init__(data, samplerate)
+                super().__init__(data, samplerate, dtype, copy)
         elif isinstance(data, str):
-            super().__init__(data, samplerate)
+            super().__init__(data, samplerate, dtype)
             if self.nchannels != 2:
                 self.copychannel(2) # duplicate channel if monaural file
         else:
-            super().__init__(data, samplerate)
+            super().__init__(data, samplerate, dtype, copy)
             if self.nchannels != 2: # last check that it is a 2-channel sound
                 ValueError('Binaural sounds must have two channels!')
 
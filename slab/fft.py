@@ -0,0 +1,65 @@
+'''
+Fourier transforms used by all classes. The transforms are computed with scipy.fft if it is installed, otherwise with
+numpy.fft. Scipy's transforms are fast for all lengths (including primes), keep the precision of float32 data, and can
+use several threads (see :meth:`slab.Signal.set_fft_workers`).
+'''
+
+import functools
+import numpy
+try:
+    import scipy.fft
+    have_scipy = True
+except ImportError:
+    have_scipy = False
+
+_workers = None  #: Number of threads used by the transforms (None for one thread, -1 for all processors)
+
+
+def set_workers(workers):
+    'Sets the number of threads used by the transforms (see :meth:`slab.Signal.set_fft_workers`).'
+    global _workers
+    _workers = workers
+
+
+@functools.lru_cache(maxsize=1024)
+def next_fast_len(n, real=True):
+    '''
+    Returns the smallest length of at least `n` samples for which real transforms (or complex transforms if `real` is
+    False) are fast (a product of small primes). The lengths are cached, so that repeated calls for signals of the
+    same length cost nothing.
+    '''
+    if have_scipy:
+        return scipy.fft.next_fast_len(n, real=real)
+    return 1 << (n - 1).bit_length()  # numpy.fft is fastest for powers of two
+
+
+def rfft(x, n=None, axis=-1, workers=None):
+    'Real transform, like :func:`numpy.fft.rfft`. `workers` defaults to the number set with :func:`set_workers`.'
+    if have_scipy:
+        return scipy.fft.rfft(x, n, axis=axis, workers=_workers if workers is None else workers)
+    return numpy.fft.rfft(x, n, axis=axis)
+
+
+def irfft(x, n=None, axis=-1, workers=None):
+    'Inverse real transform, like :func:`numpy.fft.irfft`.'
+    if have_scipy:
+        return scipy.fft.irfft(x, n, axis=axis, workers=_workers if workers is None else workers)
+    return numpy.fft.irfft(x, n, axis=axis)
+
+
+def fft(x, n=None, axis=-1, workers=None):
+    'Complex transform, like :func:`numpy.fft.fft`.'
+    if have_scipy:
+        return scipy.fft.fft(x, n, axis=axis, workers=_workers if workers is None else workers)
+    return numpy.fft.fft(x, n, axis=axis)
+
+
+def ifft(x, n=None, axis=-1, workers=None):
+    'Inverse complex transform, like :func:`numpy.fft.ifft`.'
+    if have_scipy:
+        return scipy.fft.ifft(x, n, axis=axis, workers=_workers if workers is None else workers)
+    return numpy.fft.ifft(x, n, axis=axis)
+
+
+rfftfreq = numpy.fft.rfftfreq
+fftfreq = numpy.fft.fftfreq
@@ -2,7 +2,12 @@
 Class for HRTFs, filterbanks, and microphone/speaker transfer functions
 '''
 
-import copy
+import collections
+import functools
+import hashlib
+import json
+import os
+import struct
 import numpy
 
 try:
@@ -16,37 +21,238 @@ try:
 except ImportError:
     have_scipy = False
 
-from slab.signal import Signal  # getting the base class
+import slab.fft
+from slab.signal import Signal, SignalBatch, _complex_dtype, _filtfilt, _linear_phase_filter  # getting the base class
+
+__all__ = ['Filter', 'Convolver', 'StreamingFilter']
+
+
+def _interp_columns(x, xp, fp):
+    '''
+    Linear interpolation like :func:`numpy.interp` of all columns of `fp` (given at the increasing points `xp`) at the
+    points `x`. The interpolation indices and weights are computed once for all columns.
+    '''
+    if len(xp) == 1:
+        return numpy.repeat(fp[:1], len(x), axis=0)
+    idx = numpy.clip(numpy.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    weight = numpy.clip((x - xp[idx]) / (xp[idx + 1] - xp[idx]), 0, 1)[:, numpy.newaxis]
+    return fp[idx] * (1 - weight) + fp[idx + 1] * weight
+
+
+def _firwin2_columns(ntaps, freq, gains, samplerate, workers=None):
+    '''
+    Linear-phase FIR filters with the gains in the columns of `gains` at the frequencies `freq` (which must start at 0
+    and end at samplerate/2), designed like :func:`scipy.signal.firwin2` with a Hamming window, as array with shape
+    (ntaps, ncolumns). The gains of all filters are interpolated and transformed at once with `workers` threads
+    (defaults to the number set with :meth:`Signal.set_fft_workers`). Raises a ValueError for the inputs that
+    :func:`scipy.signal.firwin2` rejects.
+    '''
+    freq, gains = numpy.asarray(freq, dtype=float), numpy.asarray(gains, dtype=float)
+    if freq.shape[0] != gains.shape[0]:
+        raise ValueError('freq and gains must be of same length.')
+    if freq[0] != 0 or freq[-1] != samplerate/2:
+        raise ValueError('freq must start with 0 and end with samplerate/2.')
+    d = numpy.diff(freq)
+    if numpy.any(d < 0):
+        raise ValueError('The values in freq must be nondecreasing.')
+    if numpy.any(d[:-1] + d[1:] == 0):
+        raise ValueError('A value in freq must not occur more than twice.')
+    if freq[1] == 0:
+        raise ValueError('Value 0 must not be repeated in freq.')
+    if freq[-2] == samplerate/2:
+        raise ValueError('Value samplerate/2 must not be repeated in freq.')
+    if ntaps % 2 == 0 and numpy.any(gains[-1] != 0):
+        raise ValueError('Filters with an even number of taps must have zero gain at the Nyquist frequency.')
+    nfreqs = 1 + 2 ** int(numpy.ceil(numpy.log2(ntaps)))
+    x = numpy.linspace(0.0, samplerate/2, nfreqs)
+    shift = numpy.exp(-(ntaps - 1) / 2. * 1j * numpy.pi * x / (samplerate/2))
+    spectra = _interp_columns(x, freq, gains)
+    taps = slab.fft.irfft(spectra * shift[:, numpy.newaxis], axis=0, workers=workers)[:ntaps]
+    return taps * scipy.signal.get_window('hamming', ntaps, fftbins=False)[:, numpy.newaxis]
+
+
+_gain_cache = collections.OrderedDict()  # interpolated gains and partitioned spectra of filters, least recently used first
+_gain_cache_max_bytes = 2**28  #: Maximal size of the cache of interpolated gains and partitioned spectra in bytes
+_gain_cache_stats = {'hits': 0, 'misses': 0, 'nbytes': 0}  # nbytes is the running total size of the cached arrays
+_file_magic = b'\x93SLABFLT'  # start of filter files, distinguishes them from .npy files of earlier versions
+_file_version = 1  #: Version of the filter file format written by Filter.save
+_file_alignment = 64  # the data in filter files starts at a multiple of this many bytes
+
+
+def _cached(key, compute):
+    '''
+    Returns the array cached under `key`, or computes it by calling `compute` and caches it. The cache holds results
+    computed from filters (keys start with a digest of the contents of the filter, see :meth:`Filter._contents_key`,
+    so that changing the data of a filter in any way makes its earlier results unreachable) and removes the least
+    recently used arrays when their size exceeds `_gain_cache_max_bytes`. Cached arrays are read-only.
+    '''
+    result = _gain_cache.get(key)
+    if result is not None:
+        _gain_cache.move_to_end(key)
+        _gain_cache_stats['hits'] += 1
+        return result
+    _gain_cache_stats['misses'] += 1
+    result = compute()
+    result.flags.writeable = False  # shared between all calls
+    if result.nbytes <= _gain_cache_max_bytes:
+        _gain_cache[key] = result
+        _gain_cache_stats['nbytes'] += result.nbytes
+        while _gain_cache_stats['nbytes'] > _gain_cache_max_bytes:
+            _, removed = _gain_cache.popitem(last=False)  # remove the least recently used arrays
+            _gain_cache_stats['nbytes'] -= removed.nbytes
+    return result
+
+
+def _read_only(data):
+    'Returns whether the samples of the array `data` cannot be changed, through `data` or the arrays it is a view of.'
+    while isinstance(data, numpy.ndarray):
+        if data.flags.writeable:
+            return False
+        data = data.base
+    return True  # an array that owns its memory, or a read-only memory map
+
+
+@functools.lru_cache(maxsize=64)
+def _center_freqs(low_cutoff, high_cutoff, bandwidth, pass_bands):
+    'Cached implementation of :meth:`Filter._center_freqs`; the returned center frequencies are read-only.'
+    ref_freq = 1000  # Hz, reference for conversion between oct and erb bandwidth
+    ref_erb = Filter._freq2erb(ref_freq)
+    erb_spacing = Filter._freq2erb(ref_freq*2**bandwidth) - ref_erb
+    h = Filter._freq2erb(high_cutoff)
+    l = Filter._freq2erb(low_cutoff)
+    nfilters = int(numpy.round((h - l) / erb_spacing))
+    center_freqs, erb_spacing = numpy.linspace(l, h, nfilters, retstep=True)
+    if not pass_bands:
+        center_freqs = center_freqs[1:-1]  # exclude low and highpass filters
+    bandwidth = numpy.log2(Filter._erb2freq(ref_erb + erb_spacing) /
+                           ref_freq)  # convert erb_spacing to octaves
+    center_freqs.flags.writeable = False  # shared between all calls
+    return center_freqs, bandwidth, erb_spacing
+
+
+@functools.lru_cache(maxsize=8)
+def _cos_filterbank_gains(length, bandwidth, low_cutoff, high_cutoff, pass_bands, samplerate):
+    '''
+    Returns the gains of :meth:`Filter.cos_filterbank` with shape (nfrequencies, nfilters). The gains of all filters
+    are computed at once and cached, so that repeated calls with the same arguments return the same read-only array.
+    '''
+    freqs_erb = Filter._freq2erb(slab.fft.rfftfreq(length, d=1/samplerate))
+    center_freqs, _, erb_spacing = _center_freqs(low_cutoff, high_cutoff, bandwidth, pass_bands)
+    # each filter is non-zero between center - erb_spacing and center + erb_spacing (exclusive), a contiguous
+    # range of the increasing frequencies; compute the cosines for the (frequency, filter) pairs in these ranges
+    starts = numpy.searchsorted(freqs_erb, center_freqs - erb_spacing, side='right')
+    stops = numpy.maximum(numpy.searchsorted(freqs_erb, center_freqs + erb_spacing, side='left'), starts)
+    counts = stops - starts
+    cols = numpy.repeat(numpy.arange(len(center_freqs)), counts)
+    rows = numpy.arange(counts.sum()) + numpy.repeat(starts - numpy.cumsum(counts) + counts, counts)
+    filts = numpy.zeros((len(freqs_erb), len(center_freqs)))
+    filts[rows, cols] = numpy.cos((freqs_erb[rows] - center_freqs[cols]) / (erb_spacing * 2) * numpy.pi)
+    filts.flags.writeable = False  # shared between all calls
+    return filts
 
 
 class Filter(Signal):
     '''
-    Class for generating and manipulating filterbanks and transfer functions.
+    Class for generating and manipulating filterbanks and transfer functions. Filters are FIR filters (`fir` is True,
+    the data holds the taps), FFT filters (`fir` is False, the data holds the gains at the :attr:`frequencies`) or IIR
+    filters in second-order sections (`iir` is True, each column of the data holds the flattened sections of one
+    filter). IIR filters are made from sections with shape (nsections, 6), as returned by :func:`scipy.signal.butter`
+    with ``output='sos'``, or (nfilters, nsections, 6) for filter banks. The coefficients of IIR filters are kept in
+    float64 unless another `dtype` is given, because rounding them to float32 can move the poles and make narrow or
+    low-frequency filters unstable. IIR filters have no taps and no duration (:attr:`ntaps` and :attr:`duration`
+    raise a ValueError), and their :attr:`nsamples` is the number of coefficients (6 per section) of each filter.
 
     '''
     # instance properties
     nfilters = property(fget=lambda self: self.nchannels, doc='The number of filters in the bank.')
-    ntaps = property(fget=lambda self: self.nsamples, doc='The number of filter taps.')
+
+    def _get_ntaps(self):
+        if self.iir:
+            raise ValueError('IIR filters have no taps, they consist of second-order sections (see sos).')
+        return self.nsamples
+
+    def _get_duration(self):
+        if self.iir:
+            raise ValueError('IIR filters have no duration, they consist of second-order sections (see sos).')
+        return self.nsamples / self.samplerate
+
+    ntaps = property(fget=_get_ntaps, doc='The number of filter taps (FIR filters) or frequency bins (FFT filters).')
+    duration = property(fget=_get_duration, doc='The length of the filter in seconds (not defined for IIR filters).')
     nfrequencies = property(fget=lambda self: self.nsamples, doc='The number of frequency bins.')
-    frequencies = property(fget=lambda self: numpy.fft.rfftfreq(self.ntaps*2-1, d=1/self.samplerate)
-                           if not self.fir else None, doc='The frequency axis of the filter.')
+    frequencies = property(fget=lambda self: slab.fft.rfftfreq(self.ntaps*2-1, d=1/self.samplerate)
+                           if not (self.fir or self.iir) else None, doc='The frequency axis of the filter.')
+    sos = property(fget=lambda self: self.data.T.reshape(self.nfilters, -1, 6) if self.iir else None,
+                   doc='The second-order sections of IIR filters with shape (nfilters, nsections, 6).')
+
+    def _set_data(self, data):
+        self._data = data
+        self._digest = None  # the digest of the new contents is computed when it is needed (see _contents_key)
 
-    def __init__(self, data, samplerate=None, fir=True):
-        if fir and not have_scipy:
-            raise ImportError('FIR filters require scipy.')
-        super().__init__(data, samplerate)
-        self.fir = fir
+    data = property(fget=lambda self: self._data, fset=_set_data, doc='''
+    The filter taps or gains as array with shape (ntaps, nfilters). When results computed from the filter are cached
+    (the interpolated gains of FFT filters, for instance), the array is made read-only, so that a direct change
+    (``filt.data[:, 0] = gains``) raises an error instead of leaving stale results in the cache. Assignments via
+    indexing of the filter (``filt[:, 0] = gains``), arithmetic operators (``filt *= 2``), and assigning a new array
+    (``filt.data = gains``) work as usual.
+    ''')
+
+    def __init__(self, data, samplerate=None, fir=True, dtype=None, copy=True, iir=False):
+        if (fir or iir) and not have_scipy:
+            raise ImportError('FIR and IIR filters require scipy.')
+        if iir:
+            data = numpy.asarray(getattr(data, 'data', data))
+            if data.ndim == 2 and data.shape[-1] == 6:  # sections of one filter
+                data = data.reshape(-1, 1)
+            elif data.ndim == 3:  # sections of several filters
+                data = data.reshape(len(data), -1).T
+            if data.shape[0] % 6:
+                raise ValueError('IIR filters must consist of second-order sections with 6 coefficients each.')
+            if dtype is None:  # rounding the coefficients to the default float32 can make the filters unstable
+                dtype = 'float64'
+        super().__init__(data, samplerate, dtype, copy)
+        if iir and self.data.shape != data.shape[:1] + self.data.shape[1:]:
+            self.data = self.data.T  # Signal transposes banks with more filters than coefficients
+        self.fir = fir and not iir
+        self.iir = iir
 
     def __repr__(self):
-        return f'{type(self)} (\n{repr(self.data)}\n{repr(self.samplerate)}\n{repr(self.fir)})'
+        return f'{type(self)} (\n{repr(self.data)}\n{repr(self.samplerate)}\n{repr(self.fir)}\n{repr(self.iir)})'
+
+    def __setitem__(self, key, value):
+        if not self.data.flags.writeable:  # read-only data, like that of memory-mapped or cached filters
+            self.data = self.data.copy()
+        super().__setitem__(key, value)
+
+    def _contents_key(self):
+        '''
+        Returns a digest of the data, shape, sample type and kind of the filter, which identifies results computed
+        from the filter in the cache (see :meth:`gain_cache_info`), so that filters with the same contents share
+        their cached results. The digest is computed once and kept until the data is replaced, so that memory-mapped
+        filters (see :meth:`load`) are not read again on every call. Data that owns its memory is made read-only, so
+        that it cannot change without a new digest (see :attr:`data`). Views of writable memory (for instance the
+        channels of another filter) can change through that memory, so their digest is computed on every call.
+        '''
+        if self._digest is None or not _read_only(self.data):
+            if self.data.flags.owndata:
+                self.data.flags.writeable = False
+            data = numpy.ascontiguousarray(self.data)
+            digest = (hashlib.blake2b(data, digest_size=16).digest(), data.shape, data.dtype.str)
+            if not _read_only(self.data):
+                return digest + (self.fir, self.iir)
+            self._digest = digest
+        return self._digest + (self.fir, self.iir)
 
     def __str__(self):
+        if self.iir:
+            return f'{type(self)}, filters {self.nfilters}, IIR: sections {self.nsamples // 6}, ' \
+                   f'samplerate {self.samplerate}'
         if self.fir:
             return f'{type(self)}, filters {self.nfilters}, FIR: taps {self.ntaps}, samplerate {self.samplerate}'
         return f'{type(self)}, filters {self.nfilters}, FFT: freqs {self.nfrequencies}, samplerate {self.samplerate}'
 
     @staticmethod
-    def band(frequency=100, gain=None, kind='hp', samplerate=None, length=1000, fir=True):
+    def band(frequency=100, gain=None, kind='hp', samplerate=None, length=1000, fir=True, iir=None, order=4,
+             ripple=1, attenuation=60):
         '''
         Design simple passband or stopband filters, or filters with a transfer function set by frequency/gain pairs.
 
@@ -56,6 +262,12 @@ class Filter(Signal):
             samplerate: samplerate of the filter (defaults to the rate set with slab.set_default_samplerate)
             length: number of taps or frequency bins of the filter
             fir: whether to design a FIR or an FFR filter (FIR filters require Scipy)
+            iir: if 'butter', 'cheby1', 'cheby2', 'ellip', or 'bessel', design an IIR filter of that type in
+                second-order sections instead (requires Scipy). IIR filters need far fewer operations per sample than
+                FIR filters, but cannot have arbitrary transfer functions (`gain` must be None).
+            order: order of IIR filters (bandpass and bandstop filters have twice this order)
+            ripple: maximal ripple in the passband of 'cheby1' and 'ellip' IIR filters in dB
+            attenuation: minimal attenuation in the stopband of 'cheby2' and 'ellip' IIR filters in dB
 
         >>> sig = Sound.whitenoise()
         >>> filt = Filter(f=3000, kind='lp', fir=False)
@@ -63,6 +275,15 @@ class Filter(Signal):
         >>> _ = sig.spectrum()
         '''
         samplerate = Filter.get_samplerate(samplerate)
+        if iir:  # design an IIR filter in second-order sections
+            if not have_scipy:
+                raise ImportError('Generating IIR filters requires Scipy.')
+            if gain is not None:
+                raise ValueError('IIR filters with arbitrary transfer functions are not supported.')
+            btype = {'lp': 'lowpass', 'hp': 'highpass', 'bp': 'bandpass', 'bs': 'bandstop', 'notch': 'bandstop'}[kind]
+            sos = scipy.signal.iirfilter(order, frequency, rp=ripple, rs=attenuation, btype=btype, ftype=iir,
+                                         output='sos', fs=samplerate)
+            return Filter(data=sos, samplerate=samplerate, iir=True, copy=False)
         if fir:  # design a FIR filter
             if not have_scipy:
                 raise ImportError('Generating FIR filters requires Scipy.')
@@ -101,9 +322,9 @@ class Filter(Signal):
             else:
                 freqs = numpy.arange(0, (samplerate/2)+df, df) # frequency bins
                 filt = numpy.interp(freqs, [0] + frequency + [samplerate/2], [0] + gain + [0])
-        return Filter(data=filt, samplerate=samplerate, fir=fir)
+        return Filter(data=filt, samplerate=samplerate, fir=fir, copy=False)
 
-    def apply(self, sig):
+    def apply(self, sig, zero_phase=True, dtype=None, out=None):
         '''
         Apply the filter to signal `sig`. If signal and filter have the same number of channels,
         each filter channel will be applied to the corresponding channel in the signal.
@@ -111,83 +332,139 @@ class Filter(Signal):
         In that case the filtered signal wil contain the same number of channels as the filter with every
         channel being a copy of the original signal with one filter channel applied. If the filter has only
         one channel and the signal has multiple channels, the same filter is applied to each signal channel.
+        All filters are applied at once: FFT filters multiply one spectrum of the signal with the gains of all filters
+        and FIR filters are convolved with the signal together.
+        `sig` can also be a :class:`SignalBatch`, in which case the filter is applied to all signals in the batch at once.
+        FIR filters are applied by direct convolution if they are short, and by FFT convolution otherwise. If
+        `zero_phase` is True, they are applied forward and backward, like :func:`scipy.signal.filtfilt`, which
+        cancels the phase shift and squares the magnitude response. If False, they are applied once, and the delay of
+        a linear-phase (symmetric) filter, (ntaps-1)//2 samples, is removed from the output. IIR filters are applied
+        forward and backward with :func:`scipy.signal.sosfiltfilt` if `zero_phase` is True, and causally with
+        :func:`scipy.signal.sosfilt` otherwise (the output is then delayed by the filter). A single IIR filter is applied
+        to all channels at once, the filters of an IIR bank one after the other (scipy takes one set of sections per
+        call).
+        The filtered signal has the sample type `dtype`, or the type of `sig` if None (see
+        :meth:`Signal.set_default_dtype`); spectra of float32 signals are computed as complex64. If `out` is an
+        array or Signal with the shape of the filtered signal, the result is written into it instead of a new array.
+        Memory-mapped signals (see :meth:`Sound.memmap`) are filtered channel by channel, so that only one channel
+        of the signal is held in memory besides the result.
         '''
         if (self.samplerate != sig.samplerate) and (self.samplerate != 1):
             raise ValueError('Filter and signal have different sampling rates.')
-        out = copy.deepcopy(sig)
-        if self.fir:
+        if (self.nfilters == sig.nchannels) or (self.nfilters == 1):  # one filter per channel or one for all
+            nchannels = sig.nchannels
+        elif sig.nchannels == 1:  # apply all filters in bank to signal
+            nchannels = self.nfilters
+        else:
+            raise ValueError(
+                'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+        # for batches, the leading axis indexes the signals and the filters are applied along the time axis (-2)
+        shape = sig.data.shape[:-1] + (nchannels,)
+        dtype = sig.data.dtype if dtype is None else Signal.get_dtype(dtype)
+        if out is None:
+            out = sig._new_from_data(numpy.empty(shape, dtype=dtype))
+        elif getattr(out, 'data', out).shape != shape:
+            raise ValueError(f'The output must have the shape of the filtered signal {shape}.')
+        elif not isinstance(out, (Signal, SignalBatch)):
+            out = sig._new_from_data(out)
+        # memory-mapped signals are filtered one output channel at a time, so that only one channel of the signal is
+        # read into memory; each part is (output channels, filters, signal channels)
+        mapped = isinstance(sig.data, numpy.memmap)
+        if mapped:
+            parts = [(slice(chan, chan + 1), slice(min(chan, self.nfilters - 1), min(chan, self.nfilters - 1) + 1),
+                      slice(min(chan, sig.nchannels - 1), min(chan, sig.nchannels - 1) + 1))
+                     for chan in range(nchannels)]
+        else:
+            parts = [(slice(None), slice(None), slice(None))]
+        if self.iir:
             if not have_scipy:
-                raise ImportError('Applying FIR filters requires Scipy.')
-            if self.nfilters == sig.nchannels:  # filter each channel with corresponding filter
-                for i in range(self.nfilters):
-                    out.data[:, i] = scipy.signal.filtfilt(
-                        self.data[:, i], [1], out.data[:, i], axis=0)
-            elif (self.nfilters == 1) and (sig.nchannels > 1):  # filter each channel
-                for i in range(self.nfilters):
-                    out.data[:, i] = scipy.signal.filtfilt(
-                        self.data.flatten(), [1], out.data[:, i], axis=0)
-            elif (self.nfilters > 1) and (sig.nchannels == 1):  # apply all filters in bank to signal
-                out.data = numpy.empty((sig.nsamples, self.nfilters))
-                for filt in range(self.nfilters):
-                    out.data[:, filt] = scipy.signal.filtfilt(
-                        self[:, filt], [1], sig.data, axis=0).flatten()
+                raise ImportError('Applying IIR filters requires Scipy.')
+            apply_sos = scipy.signal.sosfiltfilt if zero_phase else scipy.signal.sosfilt
+            sos = self.sos
+            if self.nfilters == 1 and not mapped:  # one filter for all channels
+                out.data[...] = apply_sos(sos[0], sig.data, axis=-2)
             else:
-                raise ValueError(
-                    'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+                for chan in range(nchannels):
+                    out.data[..., chan] = apply_sos(sos[min(chan, self.nfilters - 1)],
+                                                    sig.data[..., min(chan, sig.nchannels - 1)], axis=-1)
+        elif self.fir:
+            if not have_scipy:
+                raise ImportError('Applying FIR filters requires Scipy.')
+            # filters and signal channels broadcast against each other (one filter for all channels, or a bank of
+            # filters for one channel)
+            apply_fir = _filtfilt if zero_phase else _linear_phase_filter
+            for out_chans, filts, sig_chans in parts:
+                out.data[..., out_chans] = apply_fir(self.data[:, filts], sig.data[..., sig_chans], axis=-2)
         else:  # FFT filter
-            sig_rfft = numpy.fft.rfft(sig.data, axis=0)
-            sig_freq_bins = numpy.fft.rfftfreq(sig.nsamples, d=1/sig.samplerate)
-            filt_freq_bins = self.frequencies
-            # interpolate the FFT filter bins to match the length of the fft of the signal
-            if self.nfilters == sig.nchannels:  # filter each channel with corresponding filter
-                for chan in range(sig.nchannels):
-                    _filt = numpy.interp(sig_freq_bins, filt_freq_bins, self[:, chan])
-                    out.data[:, chan] = numpy.fft.irfft(sig_rfft[:, chan] * _filt, sig.nsamples)
-            elif (self.nfilters == 1) and (sig.nchannels > 1):  # filter each channel
-                _filt = numpy.interp(sig_freq_bins, filt_freq_bins, self.data.flatten())
-                for chan in range(sig.nchannels):
-                    out.data[:, chan] = numpy.fft.irfft(sig_rfft[:, chan] * _filt, sig.nsamples)
-            elif (self.nfilters > 1) and (sig.nchannels == 1):  # apply all filters in bank to signal
-                out.data = numpy.empty((sig.nsamples, self.nfilters))
-                for filt in range(self.nfilters):
-                    _filt = numpy.interp(sig_freq_bins, filt_freq_bins, self[:, filt])
-                    out.data[:, filt] = numpy.fft.irfft(sig_rfft.flatten() * _filt, sig.nsamples)
-            else:
-                raise ValueError(
-                    'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+            gains = self._interpolated_gains(sig.nsamples, sig.samplerate, dtype)
+            for out_chans, filts, sig_chans in parts:
+                # spectra and gains in the precision of the output (complex64 for float32 output)
+                sig_rfft = slab.fft.rfft(sig.data[..., sig_chans], axis=-2).astype(_complex_dtype(dtype), copy=False)
+                out.data[..., out_chans] = slab.fft.irfft(sig_rfft * gains[:, filts], sig.nsamples, axis=-2)
         return out
 
+    def _interpolated_gains(self, nsamples, samplerate, dtype=None):
+        '''
+        Returns the gains of an FFT filter linearly interpolated at the frequencies of the spectrum of a signal with
+        `nsamples` samples at `samplerate`, as read-only array of type `dtype` with shape (nfrequencies, nfilters).
+        The gains are kept in a cache of limited size (see :meth:`gain_cache_info`), so that applying the same
+        filter to signals of the same length is only a multiplication of spectra.
+        '''
+        dtype = numpy.dtype(self.data.dtype if dtype is None else dtype)
+
+        def interpolate():
+            sig_freq_bins = slab.fft.rfftfreq(nsamples, d=1/samplerate)
+            return _interp_columns(sig_freq_bins, self.frequencies, self.data).astype(dtype, copy=False)
+        return _cached((self._contents_key(), 'gains', self.samplerate, nsamples, samplerate, dtype), interpolate)
+
+    def _partition_spectra(self, size, start=0, stop=None):
+        '''
+        Returns the spectra of the taps `start` to `stop` of a FIR filter in partitions of `size` taps, each zero-padded
+        to 2*size samples, as read-only array with shape (npartitions, size+1, nfilters). The spectra are cached like
+        the gains of FFT filters (see :meth:`gain_cache_info`), so that a :class:`Convolver` can reuse them.
+        '''
+        stop = self.ntaps if stop is None else min(stop, self.ntaps)
+
+        def transform():
+            npartitions = -(-(stop - start) // size)
+            taps = numpy.zeros((npartitions * size, self.nfilters))
+            taps[:stop - start] = self.data[start:stop]
+            return slab.fft.rfft(taps.reshape(npartitions, size, self.nfilters), 2 * size, axis=1)
+        return _cached((self._contents_key(), 'partitions', size, start, stop), transform)
+
+    @staticmethod
+    def gain_cache_info():
+        '''
+        Returns a dictionary with the number of `hits` and `misses` of the cache of interpolated FFT filter gains
+        used by :meth:`apply` and of the partitioned spectra used by :class:`Convolver`, the number of cached arrays
+        (`size`), and their memory in bytes (`nbytes`, limited to `slab.filter._gain_cache_max_bytes`).
+        '''
+        return dict(_gain_cache_stats, size=len(_gain_cache))
+
+    @staticmethod
+    def clear_gain_cache():
+        'Empties the cache of interpolated FFT filter gains and partitioned spectra and resets its statistics.'
+        _gain_cache.clear()
+        _gain_cache_stats.update(hits=0, misses=0, nbytes=0)
+
     def tf(self, channels='all', nbins=None, show=True, axis=None, **kwargs):
         '''
         Computes the transfer function of a filter (magnitude over frequency).
         Returns transfer functions of filter at index 'channels' (int or list) or, if channels='all' returns all
         transfer functions. If show=True then plot the response, else return magnitude and frequency vectors.
+        The transfer functions of all filters are computed at once (for FIR filters with one FFT with 2*nbins points)
+        and cached, so that repeated calls with the same `nbins` only select the channels.
         '''
         if isinstance(channels, int): # check chan is in range of nfilters
             channels = [channels]
         elif channels == 'all':
             channels = list(range(self.nfilters))  # now we have a list of filter indices to process
         if not nbins:
-            nbins = self.data.shape[0]
-        if self.fir:
-            if not have_scipy:
-                raise ImportError('Computing transfer functions of FIR filters requires Scipy.')
-            h = numpy.empty((nbins, len(channels)))
-            for i, idx in enumerate(channels):
-                w, _h = scipy.signal.freqz(self.channel(idx), worN=nbins, fs=self.samplerate)
-                h[:, i] = 20 * numpy.log10(numpy.abs(_h.flatten()))
-        else:
-            w = self.frequencies
-            data = self.data[:, channels]
-            data[data == 0] += numpy.finfo(float).eps
-            h = 20 * numpy.log10(data)
-            if not nbins == len(w): # interpolate if necessary
-                w_interp = numpy.linspace(0, w[-1], nbins)
-                h_interp = numpy.zeros((nbins, len(channels)))
-                for idx, _ in enumerate(channels):
-                    h_interp[:, idx] = numpy.interp(w_interp, w, h[:, idx])
-                h = h_interp
-                w = w_interp
+            nbins = 512 if self.iir else self.data.shape[0]
+        if (self.fir or self.iir) and not have_scipy:
+            raise ImportError('Computing transfer functions of FIR and IIR filters requires Scipy.')
+        w = self._tf_frequencies(nbins)
+        h = _cached((self._contents_key(), 'tf', nbins), lambda: self._transfer_functions(nbins))[:, channels]
         if show or (axis is not None):
             if not have_pyplot:
                 raise ImportError('Plotting transfer functions requires matplotlib.')
@@ -201,6 +478,82 @@ class Filter(Signal):
         else:
             return w, h
 
+    def _tf_frequencies(self, nbins):
+        'Returns the `nbins` frequencies at which :meth:`tf` computes the transfer functions.'
+        if self.fir or self.iir:
+            return numpy.linspace(0, self.samplerate / 2, nbins, endpoint=False)  # the frequencies of freqz
+        w = self.frequencies
+        if not nbins == len(w):  # interpolate if necessary
+            w = numpy.linspace(0, w[-1], nbins)
+        return w
+
+    def _transfer_functions(self, nbins):
+        'Returns the transfer functions in dB of all filters at the `nbins` frequencies of :meth:`tf`.'
+        if self.iir:
+            gains = numpy.stack([numpy.abs(scipy.signal.sosfreqz(sos, worN=nbins, fs=self.samplerate)[1])
+                                 for sos in self.sos], axis=1)
+        elif self.fir:  # the spectrum at nbins frequencies from 0 to the nyquist frequency
+            nfft = 2 * nbins
+            taps = self.data
+            if len(taps) > nfft:  # sampling the spectrum at nfft points aliases the taps in time
+                taps = numpy.concatenate((taps, numpy.zeros((-len(taps) % nfft, self.nfilters))))
+                taps = taps.reshape(-1, nfft, self.nfilters).sum(axis=0)
+            gains = numpy.abs(slab.fft.rfft(taps, nfft, axis=0)[:nbins])
+        else:
+            gains = numpy.where(self.data == 0, numpy.finfo(float).eps, self.data)  # avoid log of zero
+            if not nbins == self.nfrequencies:  # interpolate the dB values
+                w = numpy.linspace(0, self.frequencies[-1], nbins)
+                return _interp_columns(w, self.frequencies, 20 * numpy.log10(gains))
+        with numpy.errstate(divide='ignore'):
+            return 20 * numpy.log10(gains)
+
+    def minimum_phase(self, ntaps=None, energy=None, nfft=None):
+        '''
+        Convert FIR filters to minimum phase with the same magnitude response, using the real cepstrum (homomorphic
+        method), and optionally truncate them. A minimum-phase filter concentrates its energy in the first taps,
+        so it can be much shorter than the linear-phase filter with the same magnitude response, and it delays the
+        signal as little as possible. Apply the result causally (with a :class:`StreamingFilter` or
+        :class:`Convolver`, or :meth:`apply` with `zero_phase` True, which squares the magnitude response like for
+        every FIR filter); :meth:`apply` with `zero_phase` False assumes a linear-phase filter and shifts the output.
+
+        Arguments:
+            ntaps: maximal number of taps of the result (defaults to the number of taps of the filter).
+            energy: if given, the filters are truncated after the first tap at which all of them have this fraction of
+                their energy (for instance 0.999), or after `ntaps` taps if that is shorter.
+            nfft: number of points of the spectra used for the conversion (defaults to the next power of two that is at
+                least 8 times the number of taps). More points reduce the error due to aliasing of the cepstrum.
+        Returns:
+            (slab.Filter, numpy.ndarray): the minimum-phase filters, and the magnitude error of each filter, which is
+            the root mean square difference between the magnitude responses of the original and the converted filter
+            (from 0 Hz to samplerate/2) relative to the root mean square magnitude of the original.
+
+        >>> equalizer = Filter.equalizing_filterbank(target, recording)
+        >>> short, error = equalizer.minimum_phase(energy=0.999)
+        >>> streaming = StreamingFilter(short, nchannels=recording.nchannels)
+        '''
+        if not self.fir:
+            raise ValueError('Only FIR filters can be converted to minimum phase.')
+        ntaps = self.ntaps if ntaps is None else min(ntaps, self.ntaps)
+        if nfft is None:
+            nfft = 2**int(numpy.ceil(numpy.log2(8 * self.ntaps)))
+        magnitude = numpy.abs(slab.fft.rfft(self.data, nfft, axis=0))
+        # the logarithm of zero gains is limited to 200 dB below the largest gain of each filter
+        floor = numpy.max(magnitude, axis=0) * 1e-10
+        cepstrum = slab.fft.irfft(numpy.log(numpy.maximum(magnitude, floor)), nfft, axis=0)
+        # fold the anticausal part of the cepstrum onto the causal part
+        fold = numpy.zeros(nfft)
+        fold[0] = fold[nfft // 2] = 1
+        fold[1:(nfft + 1) // 2] = 2
+        taps = slab.fft.irfft(numpy.exp(slab.fft.rfft(cepstrum * fold[:, numpy.newaxis], axis=0)), nfft, axis=0)
+        taps = taps[:ntaps]
+        if energy is not None:
+            cumulative = numpy.cumsum(taps**2, axis=0)
+            needed = numpy.argmax(cumulative >= energy * cumulative[-1], axis=0) + 1
+            taps = taps[:numpy.max(needed)]
+        converted = numpy.abs(slab.fft.rfft(taps, nfft, axis=0))
+        error = numpy.sqrt(numpy.mean((converted - magnitude)**2, axis=0) / numpy.mean(magnitude**2, axis=0))
+        return self._new_from_data(taps.astype(self.data.dtype, copy=False)), error
+
     @staticmethod
     # TODO: oversampling factor needed for cochleagram!
     def cos_filterbank(length=5000, bandwidth=1/3, low_cutoff=0, high_cutoff=None, pass_bands=False, samplerate=None):
@@ -216,6 +569,8 @@ class Filter(Signal):
             pass_bands: True or False, whether to include half cosine filters as lowpass and highpass
                 If True, allows reconstruction of original bandwidth when collapsing subbands.
 
+        The gains are cached, so that calls with the same arguments only copy them into the new filter bank.
+
         >>> sig = Sound.pinknoise(samplerate=44100)
         >>> fbank = Filter.cos_filterbank(length=sig.nsamples, bandwidth=1/10, low_cutoff=100, samplerate=sig.samplerate)
         >>> fbank.tf(plot=True)
@@ -224,36 +579,50 @@ class Filter(Signal):
         samplerate = Signal.get_samplerate(samplerate)
         if not high_cutoff:
             high_cutoff = samplerate / 2
-        freq_bins = numpy.fft.rfftfreq(length, d=1/samplerate)
-        nfreqs = len(freq_bins)
-        center_freqs, bandwidth, erb_spacing = Filter._center_freqs(
-            low_cutoff=low_cutoff, high_cutoff=high_cutoff, bandwidth=bandwidth, pass_bands=pass_bands)
-        nfilters = len(center_freqs)
-        filts = numpy.zeros((nfreqs, nfilters))
-        freqs_erb = Filter._freq2erb(freq_bins)
-        for i in range(nfilters):
-            l = center_freqs[i] - erb_spacing
-            h = center_freqs[i] + erb_spacing
-            avg = center_freqs[i]  # center of filter
-            rnge = erb_spacing * 2  # width of filter
-            filts[(freqs_erb > l) & (freqs_erb < h), i] = numpy.cos(
-                (freqs_erb[(freqs_erb > l) & (freqs_erb < h)] - avg) / rnge * numpy.pi)
-        return Filter(data=filts, samplerate=samplerate, fir=False)
+        filts = _cos_filterbank_gains(length, bandwidth, low_cutoff, high_cutoff, pass_bands, samplerate)
+        return Filter(data=filts, samplerate=samplerate, fir=False)  # a writable copy of the cached gains
+
+    @staticmethod
+    def gammatone_filterbank(bandwidth=1/3, low_cutoff=0, high_cutoff=None, samplerate=None, order=4):
+        '''
+        Create a bank of all-pole gammatone filters (APGF), a recursive approximation of the gammatone filters of the
+        auditory periphery. The center frequencies are spaced like in :meth:`cos_filterbank` (without the low- and
+        highpass filters at the edges), and the bandwidth of each filter is 1.019 ERB at its center frequency. Each
+        filter consists of `order` identical pairs of complex-conjugate poles and has a gain of one at its center
+        frequency. The bank is an IIR filter (see :class:`Filter`), so it is applied in linear time with little
+        memory, and block by block with a :class:`StreamingFilter`. Unlike the cosine filters, the filters do not
+        add up to a flat transfer function.
+
+        Arguments:
+            bandwidth: spacing of the center frequencies in octaves
+            low_cutoff: lower limit of frequency range
+            high_cutoff: upper limit of frequency range (defaults to samplerate/2).
+            samplerate: samplerate of the filters
+            order: number of second-order sections of each filter
+
+        >>> sig = Sound.pinknoise(duration=60.0, samplerate=44100)
+        >>> fbank = Filter.gammatone_filterbank(bandwidth=1/5, low_cutoff=20, samplerate=sig.samplerate)
+        >>> subbands = fbank.apply(sig, zero_phase=False)
+        '''
+        samplerate = Signal.get_samplerate(samplerate)
+        if not high_cutoff:
+            high_cutoff = samplerate / 2
+        center_freqs = Filter._erb2freq(Filter._center_freqs(low_cutoff, high_cutoff, bandwidth)[0])
+        erbs = 24.7 + center_freqs / 9.265  # equivalent rectangular bandwidths (Glasberg and Moore)
+        radius = numpy.exp(-2 * numpy.pi * 1.019 * erbs / samplerate)  # pole radius and angle of each filter
+        theta = 2 * numpy.pi * center_freqs / samplerate
+        sections = numpy.zeros((len(center_freqs), 6))
+        sections[:, 3] = 1
+        sections[:, 4] = -2 * radius * numpy.cos(theta)
+        sections[:, 5] = radius**2
+        # numerator of each section: the magnitude of the denominator at the center frequency (unit gain)
+        sections[:, 0] = numpy.abs(1 + sections[:, 4] * numpy.exp(-1j * theta) + sections[:, 5] * numpy.exp(-2j * theta))
+        return Filter(data=numpy.repeat(sections[:, numpy.newaxis], order, axis=1), samplerate=samplerate, iir=True)
 
     @staticmethod
     def _center_freqs(low_cutoff, high_cutoff, bandwidth=1/3, pass_bands=False):
-        ref_freq = 1000  # Hz, reference for conversion between oct and erb bandwidth
-        ref_erb = Filter._freq2erb(ref_freq)
-        erb_spacing = Filter._freq2erb(ref_freq*2**bandwidth) - ref_erb
-        h = Filter._freq2erb(high_cutoff)
-        l = Filter._freq2erb(low_cutoff)
-        nfilters = int(numpy.round((h - l) / erb_spacing))
-        center_freqs, erb_spacing = numpy.linspace(l, h, nfilters, retstep=True)
-        if not pass_bands:
-            center_freqs = center_freqs[1:-1]  # exclude low and highpass filters
-        bandwidth = numpy.log2(Filter._erb2freq(ref_erb + erb_spacing) /
-                               ref_freq)  # convert erb_spacing to octaves
-        return center_freqs, bandwidth, erb_spacing
+        center_freqs, bandwidth, erb_spacing = _center_freqs(low_cutoff, high_cutoff, bandwidth, pass_bands)
+        return center_freqs.copy(), bandwidth, erb_spacing  # the cached center frequencies are read-only
 
     @staticmethod
     def collapse_subbands(subbands, filter_bank=None):
@@ -262,11 +631,15 @@ class Filter(Signal):
                 length=subbands.nsamples, samplerate=subbands.samplerate)
         if subbands.samplerate != filter_bank.samplerate:
             raise ValueError('Signal and filter bank need to have the same samplerate!')
-        subbands_rfft = numpy.fft.rfft(subbands.data, axis=0)
-        subbands = numpy.fft.irfft(subbands_rfft * filter_bank.data, axis=0)
-        return Signal(data=subbands.sum(axis=1), samplerate=filter_bank.samplerate)
+        dtype = subbands.data.dtype
+        subbands_rfft = slab.fft.rfft(subbands.data, axis=0)
+        subbands = slab.fft.irfft(subbands_rfft * filter_bank.data, axis=0)
+        return Signal(data=subbands.sum(axis=1), samplerate=filter_bank.samplerate, dtype=dtype, copy=False)
 
     def filter_bank_center_freqs(self):
+        if self.iir:  # frequencies of maximal gain
+            w, h = self.tf(nbins=2**14, show=False)
+            return w[numpy.argmax(h, axis=0)]
         if self.fir:
             raise NotImplementedError('Not implemented for FIR filter banks.')
         freqs = self.frequencies
@@ -276,8 +649,28 @@ class Filter(Signal):
             center_freqs[i] = freqs[idx]  # look-up freq of index -> centre_freq for that filter
         return center_freqs
 
+    def band_levels(self, sig):
+        '''
+        Returns the levels in dB of the signal `sig` filtered with each filter of an FFT filter bank, as array with shape
+        (nfilters, nchannels). The levels are the same as those of ``self.apply(sig.channel(i)).level`` for each channel
+        i, without the calibration (see :func:`slab.calibrate`), but the signal is not filtered: the levels are
+        computed from the power spectrum of the signal and the gains of the filters (Parseval's theorem) for all
+        channels at once.
+        '''
+        if self.fir or self.iir:
+            raise ValueError('Band levels can only be computed for FFT filter banks.')
+        if (self.samplerate != sig.samplerate) and (self.samplerate != 1):
+            raise ValueError('Filter and signal have different sampling rates.')
+        power = numpy.abs(slab.fft.rfft(sig.data, axis=0))**2
+        power[1:(sig.nsamples + 1) // 2] *= 2  # the negative frequencies, except for 0 and samplerate/2
+        gains = self._interpolated_gains(sig.nsamples, sig.samplerate, float)
+        mean_square = gains.T**2 @ power / sig.nsamples**2
+        with numpy.errstate(divide='ignore'):
+            return numpy.where(mean_square == 0, 0, 10.0 * numpy.log10(mean_square / 2e-5**2))
+
     @staticmethod
-    def equalizing_filterbank(target, signal, length=1000, low_cutoff=200, high_cutoff=None, bandwidth=1/8, alpha=1.0):
+    def equalizing_filterbank(target, signal, length=1000, low_cutoff=200, high_cutoff=None, bandwidth=1/8, alpha=1.0,
+                              filter_bank=None, workers=None):
         '''
         Generate an equalizing filter from the difference between a signal and a target.
         The main intent of the function is to help with equalizing the differences between transfer functions of
@@ -288,66 +681,118 @@ class Filter(Signal):
         Alpha < 1 will reduce the total effect of the filter while alpha > 1 will amplify it (WARNING: large filter
         gains may result in temporal distortions of the signal).
         Target and signal must both be instances of slab.Sound. The target must have only a single channel, the signal
-        can have multiple ones.
+        can have multiple ones (recordings of several loudspeakers, for instance). All channels are analysed together
+        and the filters for all channels are designed at once, with `workers` threads (defaults to the number
+        set with :meth:`Signal.set_fft_workers`). Target and signal are not changed.
+        To equalize many recordings to the same target, analyse the target once: make the filter bank with
+        :meth:`cos_filterbank` (with the same `length`, `bandwidth`, `low_cutoff`, and `high_cutoff` and the
+        samplerate of the signals), compute the levels of the target with ``filter_bank.band_levels(target)``, and
+        pass the bank as `filter_bank` and the levels as `target`.
         '''
         if not have_scipy:
             raise ImportError('Generating equalizing filter banks requires Scipy.')
-        if target.nchannels > 1:
+        if isinstance(target, Signal) and target.nchannels > 1:
             raise ValueError("The target sound must have only one channel!")
-        if bool(target.nsamples % 2): # number of samples must be even:
-            target.resize(target.nsamples+1)
-        if bool(signal.nsamples % 2):
-            signal.resize(signal.nsamples+1)
-        if target.samplerate > signal.samplerate: # resample higher to lower rate if necessary
-            target = target.resample(signal.samplerate)
-        elif target.samplerate < signal.samplerate:
-            signal = signal.resample(target.samplerate)
+        if filter_bank is not None:
+            samplerate = filter_bank.samplerate
+        elif isinstance(target, Signal):  # resample higher to lower rate if necessary
+            samplerate = min(target.samplerate, signal.samplerate)
+        else:
+            samplerate = signal.samplerate
+        if isinstance(target, Signal) and target.samplerate != samplerate:
+            target = target.resample(samplerate)
+        if signal.samplerate != samplerate:
+            signal = signal.resample(samplerate)
         if high_cutoff is None:
-            high_cutoff = target.samplerate/2
-        fbank = Filter.cos_filterbank(length=length, bandwidth=bandwidth,
-                                      low_cutoff=low_cutoff, high_cutoff=high_cutoff, samplerate=target.samplerate)
+            high_cutoff = samplerate/2
+        if filter_bank is None:
+            filter_bank = Filter.cos_filterbank(length=length, bandwidth=bandwidth, low_cutoff=low_cutoff,
+                                                high_cutoff=high_cutoff, samplerate=samplerate)
         center_freqs, _, _ = Filter._center_freqs(low_cutoff, high_cutoff, bandwidth)
-        center_freqs = list(Filter._erb2freq(center_freqs))
-        center_freqs[-1] = min(center_freqs[-1], target.samplerate/2)
-        # level of the target in each of the subbands
-        levels_target = fbank.apply(target).level
-        # make it the same shape as levels_signal
-        levels_target = numpy.tile(levels_target, (signal.nchannels, 1)).T
-        # level of each channel in the signal in each of the subbands
-        levels_signal = numpy.ones((len(center_freqs), signal.nchannels))
-        for idx in range(signal.nchannels):
-            levels_signal[:, idx] = fbank.apply(signal.channel(idx)).level
-        amp_diffs = levels_target - levels_signal
+        if filter_bank.nfilters != len(center_freqs):
+            raise ValueError('The filter bank must be made with the same bandwidth and cutoff frequencies.')
+        center_freqs = Filter._erb2freq(center_freqs)
+        center_freqs[-1] = min(center_freqs[-1], samplerate/2)
+        # level of the target and of each channel of the signal in each of the subbands
+        levels_target = filter_bank.band_levels(target) if isinstance(target, Signal) else target
+        levels_target = numpy.reshape(levels_target, (-1, 1))
+        amp_diffs = levels_target - filter_bank.band_levels(signal)
         max_diffs = numpy.max(numpy.abs(amp_diffs), axis=0)
         max_diffs[max_diffs == 0] = 1
         amp_diffs = amp_diffs/max_diffs
         amp_diffs *= alpha  # apply factor for filter regulation
         amp_diffs += 1  # add 1 because gain = 1 means "do nothing"
-        center_freqs = [0] + center_freqs
-        filts = numpy.zeros((length, signal.nchannels))
-        for chan in range(signal.nchannels):
-            gain = [1] + list(amp_diffs[:,chan])
-            filt = Filter.band(frequency=list(center_freqs), gain=gain, samplerate=target.samplerate, fir=True)
-            filts[:,chan] = filt.data.flatten()
-        return Filter(data=filts, samplerate=target.samplerate, fir=True)
+        # gain of 1 at 0 Hz and, unless the last band reaches it, of 0 at samplerate/2 (like Filter.band)
+        freqs = numpy.concatenate(([0], center_freqs))
+        gains = numpy.concatenate((numpy.ones((1, signal.nchannels)), amp_diffs))
+        if freqs[-1] != samplerate/2:
+            freqs = numpy.append(freqs, samplerate/2)
+            gains = numpy.concatenate((gains, numpy.zeros((1, signal.nchannels))))
+        filts = _firwin2_columns(length, freqs, gains, samplerate, workers=workers)
+        return Filter(data=filts, samplerate=samplerate, fir=True, copy=False)
 
     def save(self, filename):
-        'Save the filter in Numpys .npy format to a file.'
-        fs = numpy.tile(self.samplerate, reps=self.nfilters)
-        fir = numpy.tile(self.fir, reps=self.nfilters)
-        fs = fs[numpy.newaxis, :]
-        fir = fir[numpy.newaxis, :]
-        to_save = numpy.concatenate((fs, fir, self.data))  # prepend the samplerate as new 'filter'
-        numpy.save(filename, to_save)
+        '''
+        Save the filter to a file. The file starts with a header that holds the format version, samplerate, kind
+        (FIR, FFT, or IIR), sample type and shape of the filter, followed by the data in its sample type, so that
+        :meth:`load` can map the data into memory instead of reading it. The file is written under exactly `filename`
+        (earlier versions of slab saved in Numpys .npy format and added the suffix '.npy' if it was missing). The data
+        is first written to a temporary file that then replaces `filename`, so that a filter that was loaded from
+        `filename` and is still mapped into memory can be saved to the same file.
+        '''
+        data = numpy.ascontiguousarray(self.data)
+        header = json.dumps({'version': _file_version, 'samplerate': float(self.samplerate),
+                             'kind': 'iir' if self.iir else 'fir' if self.fir else 'fft',
+                             'dtype': data.dtype.str, 'shape': data.shape}).encode()
+        start = len(_file_magic) + 4  # the header follows the magic bytes and its length
+        header = header.ljust(-(-(start + len(header)) // _file_alignment) * _file_alignment - start)
+        temporary = os.fspath(filename) + '.tmp'
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(_file_magic + struct.pack('<I', len(header)) + header)
+                data.tofile(file)
+            os.replace(temporary, filename)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
 
     @staticmethod
-    def load(filename):
-        'Load a filter from a .npy file.'
-        data = numpy.load(filename)
-        samplerate = data[0][0]  # samplerate is in the first filter
-        fir = bool(data[1][0])  # fir is in the first filter
-        data = data[2:, :]  # drop the samplerate and fir entries
-        return Filter(data, samplerate=samplerate, fir=fir)
+    def load(filename, mmap=True):
+        '''
+        Load a filter from a file written by :meth:`save`. If `mmap` is True, the data is mapped into memory and read
+        from the file when it is used, so that large filter banks load instantly and processes that load the same
+        file share the memory. The data is then read-only: changing the filter (for instance with ``filt *= 2``) makes
+        a copy. Files written by earlier versions of slab (in Numpys .npy format) are read completely.
+        '''
+        with open(filename, 'rb') as file:
+            magic = file.read(len(_file_magic))
+            if magic == _file_magic:
+                length, = struct.unpack('<I', file.read(4))
+                header = json.loads(file.read(length))
+        if magic != _file_magic:  # .npy file with samplerate and fir in the first rows
+            data = numpy.load(filename)
+            samplerate = data[0][0]  # samplerate is in the first filter
+            kind = {0: 'fft', 1: 'fir', 2: 'iir'}[data[1][0]]  # the kind of filter is in the first filter
+            data = data[2:, :]  # drop the samplerate and fir entries
+        else:
+            if header['version'] > _file_version:
+                raise ValueError(f'{filename} was written by a newer version of slab.')
+            offset = len(_file_magic) + 4 + length
+            shape, dtype = tuple(header['shape']), numpy.dtype(header['dtype'])
+            if mmap:
+                data = numpy.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                data = numpy.fromfile(filename, dtype=dtype, offset=offset).reshape(shape)
+            samplerate, kind = header['samplerate'], header['kind']
+        if kind == 'iir':  # sections of each filter, which are stored in the columns
+            filt = Filter(data.T.reshape(data.shape[1], -1, 6), samplerate=samplerate, iir=True, dtype=data.dtype,
+                          copy=False)
+        else:
+            filt = Filter(data, samplerate=samplerate, fir=kind == 'fir', dtype=data.dtype, copy=False)
+        if filt.data.shape != data.shape:  # Signal transposes banks with more filters than taps
+            filt.data = filt.data.T
+        return filt
 
     @staticmethod
     def _freq2erb(freq_hz):
@@ -360,6 +805,240 @@ class Filter(Signal):
         return 24.7 * 9.265 * (numpy.exp(n_erb / 9.265) - 1)
 
 
+class _ConvolutionStage:
+    '''
+    Uniformly partitioned overlap-save convolution of blocks with the partition `spectra` (see
+    :meth:`Filter._partition_spectra`) of `size` samples. The first stage of a :class:`Convolver` (`delayed` is False)
+    holds the first taps of the filter and computes the output of the current partition from the zero-padded samples
+    received so far. Later stages hold taps starting at least `size` samples into the filter, so that they only
+    need complete partitions: the output of a partition is computed when it is complete and added to the output of
+    the next partition.
+    '''
+
+    def __init__(self, spectra, size, nchannels, delayed):
+        self.spectra = spectra
+        self.size = size
+        self.nchannels = nchannels
+        self.delayed = delayed
+        npartitions, nbins, nfilters = spectra.shape
+        nchannels_out = max(nchannels, nfilters)
+        self.buffer = numpy.zeros((2 * size, nchannels))  # the last and the current partition
+        self.nbuffered = 0  # number of samples in the current partition
+        # spectra of the preceding input partitions, most recent first, and the sum of their products with the
+        # filter partitions (except the first one in the first stage), which is the part of the output of the current
+        # partition that they contribute (in the time domain for delayed stages)
+        self.history = numpy.zeros((npartitions if delayed else npartitions - 1, nbins, nchannels), dtype=complex)
+        if delayed:
+            self.pending = numpy.zeros((size, nchannels_out))
+        else:
+            self.pending = numpy.zeros((nbins, nchannels_out), dtype=complex)
+
+    def process(self, chunk):
+        '''
+        Adds `chunk`, which must fit into the current partition, and returns the contribution of the stage to the
+        output for these samples.
+        '''
+        size, start, stop = self.size, self.size + self.nbuffered, self.size + self.nbuffered + len(chunk)
+        self.buffer[start:stop] = chunk
+        if self.delayed:
+            out = self.pending[self.nbuffered:self.nbuffered + len(chunk)]
+        else:  # samples after the new ones are still zero and do not contribute to the output so far
+            spectrum = slab.fft.rfft(self.buffer, axis=0)
+            out = slab.fft.irfft(spectrum * self.spectra[0] + self.pending, 2 * size, axis=0)[start:stop]
+        self.nbuffered += len(chunk)
+        if self.nbuffered == size:  # partition complete, move on to the next one
+            if self.delayed:
+                spectrum = slab.fft.rfft(self.buffer, axis=0)
+            if len(self.history):
+                self.history[1:] = self.history[:-1]
+                self.history[0] = spectrum
+            if self.delayed:
+                self.pending = slab.fft.irfft((self.history * self.spectra).sum(axis=0), 2 * size, axis=0)[size:]
+            elif len(self.history):
+                self.pending = (self.history * self.spectra[1:]).sum(axis=0)
+            self.buffer[:size] = self.buffer[size:]
+            self.buffer[size:] = 0
+            self.nbuffered = 0
+        return out
+
+
+class Convolver:
+    '''
+    Partitioned FFT convolution with long impulse responses, like room impulse responses or HRIRs, for whole sounds
+    and for sounds that arrive in blocks. Channels of filter and sounds are combined like in :meth:`Filter.apply`.
+
+    For blocks, the taps of the FIR filter `filt` are split into partitions whose spectra are multiplied with the
+    spectra of the preceding input partitions. With uniform partitions (of `blocksize` samples), the cost per sample
+    grows with the length of the filter divided by the block size. Non-uniform `partitions`, a sequence of increasing
+    partition sizes that are multiples of each other, like (256, 4096), use small partitions for the beginning of the
+    filter (up to the second size) and larger ones for the rest, which is much cheaper for long filters. In both
+    cases, :meth:`process` returns blocks of any length without delay, so that the concatenated outputs equal the
+    convolution of the whole signal (truncated to its length). The input latency of the convolution is therefore
+    zero; the larger partitions only make the computation burstier.
+
+    :meth:`apply` convolves whole sounds. The partitioned spectra are cached together with the gains of FFT filters
+    (see :meth:`Filter.gain_cache_info`), so that convolving many sounds with the same filter transforms the
+    filter only once.
+
+    Arguments:
+        filt: a FIR :class:`Filter` with the impulse responses.
+        nchannels: number of channels of the blocks.
+        blocksize: partition size for uniform partitions.
+        partitions: sizes of non-uniform partitions, overrides `blocksize`.
+
+    >>> reverb = Filter(room_impulse_response, samplerate=44100)
+    >>> convolver = Convolver(reverb, nchannels=1, partitions=(256, 8192))
+    >>> out = [convolver.process(block) for block in blocks]  # blocks of shape (nsamples, 1)
+    >>> reverberant = convolver.apply(sound)
+    '''
+
+    def __init__(self, filt, nchannels=1, blocksize=1024, partitions=None):
+        if not filt.fir:
+            raise ValueError('Convolution requires a FIR filter.')
+        if filt.nfilters not in (1, nchannels) and nchannels != 1:
+            raise ValueError(
+                'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+        sizes = tuple(partitions) if partitions else (blocksize,)
+        if any(larger % smaller or larger <= smaller for smaller, larger in zip(sizes[:-1], sizes[1:])):
+            raise ValueError('Partition sizes must increase, and each must be a multiple of the previous one.')
+        self.filter = filt
+        self.nchannels = nchannels
+        self.partitions = sizes
+        self.reset()
+
+    def reset(self):
+        'Clears the state of the convolution, as if the preceding input had been silent.'
+        # stage k holds the taps from sizes[k] (0 for the first stage) to sizes[k+1] in partitions of sizes[k]
+        starts = (0,) + self.partitions[1:]
+        stops = self.partitions[1:] + (self.filter.ntaps,)
+        self._stages = [_ConvolutionStage(self.filter._partition_spectra(size, start, stop), size, self.nchannels,
+                                          delayed=start > 0)
+                        for size, start, stop in zip(self.partitions, starts, stops) if start < self.filter.ntaps]
+
+    def process(self, block):
+        '''
+        Convolve the next block of input samples (array or Signal with shape (nsamples, nchannels)) and return the
+        output as array with the same number of samples.
+        '''
+        block = numpy.asarray(getattr(block, 'data', block)).reshape(-1, self.nchannels)
+        out = numpy.empty((len(block), max(self.nchannels, self.filter.nfilters)), dtype=block.dtype)
+        start, first = 0, self._stages[0]
+        while start < len(block):
+            # process up to the end of the current partition of the first stage, which is also the end of a
+            # partition in all later stages, because their sizes are multiples
+            stop = min(start + first.size - first.nbuffered, len(block))
+            out[start:stop] = sum(stage.process(block[start:stop]) for stage in self._stages)
+            start = stop
+        return out
+
+    def apply(self, sig):
+        '''
+        Returns the convolution of the Signal `sig` with the filter, including the tail of the filter (nsamples +
+        ntaps - 1 samples). The signal is convolved in one pass with uniform partitions (overlap-save), using the
+        largest of the partition sizes of the convolver or the filter length, up to 2**16 samples.
+        '''
+        if (self.filter.samplerate != sig.samplerate) and (self.filter.samplerate != 1):
+            raise ValueError('Filter and signal have different sampling rates.')
+        if self.filter.nfilters not in (1, sig.nchannels) and sig.nchannels != 1:
+            raise ValueError(
+                'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+        size = max(self.partitions[-1], min(2**int(numpy.ceil(numpy.log2(self.filter.ntaps))), 2**16))
+        spectra = self.filter._partition_spectra(size)
+        nsamples = sig.nsamples + self.filter.ntaps - 1
+        nblocks = -(-nsamples // size)
+        padded = numpy.zeros(((nblocks + 1) * size, sig.nchannels))  # one partition of silence before the signal
+        padded[size:size + sig.nsamples] = sig.data
+        # each block of output needs the input of the block and the preceding one
+        blocks = numpy.concatenate((padded[:-size].reshape(nblocks, size, -1), padded[size:].reshape(nblocks, size, -1)),
+                                   axis=1)
+        inputs = slab.fft.rfft(blocks, axis=1)
+        outputs = inputs * spectra[0]
+        for i in range(1, min(len(spectra), nblocks)):  # add the products of the earlier blocks and later partitions
+            outputs[i:] += inputs[:-i] * spectra[i]
+        out = slab.fft.irfft(outputs, 2 * size, axis=1)[:, size:].reshape(nblocks * size, -1)[:nsamples]
+        return sig._new_from_data(out.astype(sig.data.dtype, copy=False))
+
+
+class StreamingFilter:
+    '''
+    Causal filter for signals that arrive in blocks, for instance when equalizing the output to a soundcard or a
+    recording that is too long to fit into memory. The filter keeps its state between calls of :meth:`process`, so
+    that the concatenated outputs equal filtering the whole signal at once (with :func:`scipy.signal.lfilter` or
+    :func:`scipy.signal.sosfilt`). Channels of filter and blocks are combined like in :meth:`Filter.apply`.
+
+    FIR filters are applied with uniformly partitioned FFT convolution (see :class:`Convolver`): the taps are split
+    into partitions of `blocksize` samples whose spectra are multiplied with the spectra of the preceding input
+    partitions. The cost per sample is therefore independent of the block length, and blocks of any length are
+    returned without additional delay. FFT filters are converted to linear-phase FIR filters with 2*nfrequencies-1
+    taps. Unlike :meth:`Filter.apply`, the filters are applied once and not forward and backward, so a linear-phase
+    filter delays the signal by (ntaps-1)/2 samples, which is kept in the attribute :attr:`latency` in seconds.
+    IIR filters are applied with :func:`scipy.signal.sosfilt`, carrying the filter state from block to block. A single
+    IIR filter is applied to all channels in one call, but the filters of a bank are applied one after the other,
+    because :func:`scipy.signal.sosfilt` takes only one set of sections per call.
+
+    Arguments:
+        filt: a :class:`Filter`, or second-order sections with shape (nsections, 6) of an IIR filter.
+        nchannels: number of channels of the blocks.
+        blocksize: number of samples per partition of FIR filters. Blocks of this length are processed most
+            efficiently.
+
+    >>> equalizer = Filter.equalizing_filterbank(target, recording)
+    >>> streaming = StreamingFilter(equalizer, nchannels=recording.nchannels)
+    >>> out = [streaming.process(block) for block in blocks]  # blocks of shape (nsamples, nchannels)
+    '''
+
+    def __init__(self, filt, nchannels=1, blocksize=1024):
+        if not have_scipy:
+            raise ImportError('Streaming filters require scipy.signal.')
+        if not isinstance(filt, Filter):
+            filt = Filter(filt, iir=True)
+        if filt.nfilters not in (1, nchannels) and nchannels != 1:
+            raise ValueError(
+                'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+        self.nchannels = nchannels
+        self.blocksize = blocksize
+        self.nfilters = filt.nfilters
+        self._sos = filt.sos
+        self._convolver = None
+        if filt.iir:
+            self.latency = 0
+        else:
+            if not filt.fir:  # zero-phase impulse responses of the gains, shifted to make them causal
+                length = filt.nfrequencies * 2 - 1
+                taps = numpy.roll(slab.fft.irfft(filt.data, length, axis=0), length // 2, axis=0)
+                filt = Filter(taps, samplerate=filt.samplerate, fir=True, copy=False)
+            self._convolver = Convolver(filt, nchannels=nchannels, blocksize=blocksize)
+            self.latency = (filt.ntaps - 1) / 2 / filt.samplerate
+        self.reset()
+
+    def reset(self):
+        'Clears the state of the filter, as if the preceding input had been silent.'
+        if self._convolver is not None:
+            self._convolver.reset()
+        else:
+            self._zi = numpy.zeros((max(self.nchannels, self.nfilters), self._sos.shape[1], 2))
+
+    def process(self, block):
+        '''
+        Filter the next block of input samples (array or Signal with shape (nsamples, nchannels)) and return the
+        filtered block as array with the same number of samples.
+        '''
+        if self._convolver is not None:
+            return self._convolver.process(block)
+        block = numpy.asarray(getattr(block, 'data', block)).reshape(-1, self.nchannels)
+        out = numpy.empty((len(block), len(self._zi)), dtype=block.dtype)
+        if not len(block):  # sosfilt does not accept empty arrays
+            return out
+        if self.nfilters == 1:  # one filter for all channels, filtered in one call with the states of all channels
+            out[...], zi = scipy.signal.sosfilt(self._sos[0], block, axis=0, zi=self._zi.transpose(1, 2, 0))
+            self._zi = zi.transpose(2, 0, 1)
+            return out
+        for chan in range(len(self._zi)):  # sosfilt takes one set of sections, so filters are applied one by one
+            out[:, chan], self._zi[chan] = scipy.signal.sosfilt(
+                self._sos[min(chan, self.nfilters - 1)], block[:, min(chan, self.nchannels - 1)], zi=self._zi[chan])
+        return out
+
+
 if __name__ == '__main__':
     filt = Filter.band(frequency=15000, kind='hp', samplerate=44100)
     filt.tf()
@@ -32,6 +32,7 @@ class HRTF():
     '''
     Class for reading and manipulating head-related transfer functions. This is essentially a collection of two Filter
     objects (hrtf.left and hrtf.right) with attributes (`nsources`, `nelevations`) and functions to manage them.
+    The filters are stored with sample type `dtype` (defaults to the type set with :meth:`slab.Signal.set_default_dtype`).
 
     >>> hrtf = HRTF(data='mit_kemar_normal_pinna.sofa') # initialize from sofa file
     >>> print(hrtf)
@@ -46,19 +47,20 @@ class HRTF():
     nelevations = property(fget=lambda self: len(self.elevations()),
                            doc='The number of elevations in the HRTF.')
 
-    def __init__(self, data, samplerate=None, sources=None, listener=None, verbose=False):
+    def __init__(self, data, samplerate=None, sources=None, listener=None, verbose=False, dtype=None):
+        dtype = Filter.get_dtype(dtype)
         if isinstance(data, str):
             if samplerate is not None:
                 raise ValueError('Cannot specify samplerate when initialising HRTF from a file.')
             if pathlib.Path(data).suffix != '.sofa':
                 raise NotImplementedError('Only .sofa files can be read.')
             f = HRTF._sofa_load(data, verbose)
-            data = HRTF._sofa_get_FIR(f)
+            data = HRTF._sofa_get_FIR(f, dtype)
             self.samplerate = HRTF._sofa_get_samplerate(f)
             self.data = []
             for idx in range(data.shape[0]):
                 # ntaps x 2 (left, right) filter
-                self.data.append(Filter(data[idx, :, :].T, self.samplerate))
+                self.data.append(Filter(data[idx, :, :].T, self.samplerate, dtype=dtype))
             self.listener = HRTF._sofa_get_listener(f)
             self.sources = HRTF._sofa_get_sourcepositions(f)
         elif isinstance(data,
@@ -72,7 +74,7 @@ class HRTF():
             data = data.data.T[..., None]
             self.data = []
             for idx in range(data.shape[0]):
-                self.data.append(Filter(data[idx, :, :].T, self.samplerate, fir=fir))
+                self.data.append(Filter(data[idx, :, :].T, self.samplerate, fir=fir, dtype=dtype))
             self.sources = sources
             if listener is None:
                 self.listener = [0, 0, 0]
@@ -81,7 +83,7 @@ class HRTF():
             self.data = []
             for idx in range(data.shape[0]):
                 # (ind x taps x ear), 2 x ntaps filter (left right)
-                self.data.append(Filter(data[idx, :, :].T, self.samplerate))
+                self.data.append(Filter(data[idx, :, :].T, self.samplerate, dtype=dtype))
             self.sources = sources
             self.listener = listener
 
@@ -145,12 +147,12 @@ class HRTF():
         return lis
 
     @staticmethod
-    def _sofa_get_FIR(f):
+    def _sofa_get_FIR(f, dtype='float'):
         'Returns an array of FIR filters for all source positions from a sofa file handle.'
         datatype = f.attrs['DataType'].decode('UTF-8')  # get data type
         if datatype != 'FIR':
             warnings.warn('Non-FIR data: ' + datatype)
-        return numpy.array(f.variables['Data.IR'], dtype='float')
+        return numpy.array(f.variables['Data.IR'], dtype=dtype)
 
     # instance methods
     def elevations(self):
@@ -159,6 +161,20 @@ class HRTF():
         '''
         return sorted(list(set(numpy.round(self.sources[:, 1]))))
 
+    def _transfer_functions(self, nbins=None, sources=None):
+        '''
+        Returns the frequencies and the transfer functions in dB (see :meth:`slab.Filter.tf`) of the `sources` (all
+        if None) as array with shape (nbins, nsources, nchannels). The filters of the sources are stacked into one
+        filter bank, so that the transfer functions are computed at once. The bank is assembled anew for each call,
+        so the transfer functions are computed directly instead of being kept in the cache of :meth:`slab.Filter.tf`.
+        '''
+        filters = self.data if sources is None else [self.data[source] for source in sources]
+        bank = filters[0]._new_from_data(numpy.concatenate([filt.data for filt in filters], axis=1))
+        if not nbins:
+            nbins = 512 if bank.iir else bank.data.shape[0]  # the default of Filter.tf
+        h = bank._transfer_functions(nbins)
+        return bank._tf_frequencies(nbins), h.reshape(nbins, len(filters), -1)
+
     def plot_tf(self, sourceidx, ear='left', xlim=(1000, 18000), nbins=None, kind='waterfall',
                 linesep=20, xscale='linear', show=True, axis=None):
         """
@@ -194,12 +210,11 @@ class HRTF():
             raise ValueError("Unknown value for ear. Use 'left', 'right', or 'both'")
         if not axis:
             fig, axis = plt.subplots()
+        freqs, tfs = self._transfer_functions(nbins, sourceidx)
         if kind == 'waterfall':
             vlines = numpy.arange(0, len(sourceidx)) * linesep
-            for idx, s in enumerate(sourceidx):
-                filt = self.data[s]
-                freqs, h = filt.tf(channels=chan, nbins=nbins, show=False)
-                axis.plot(freqs, h + vlines[idx],
+            for idx in range(len(sourceidx)):
+                axis.plot(freqs, tfs[:, idx, chan] + vlines[idx],
                           linewidth=0.75, color='0.0', alpha=0.7)
             ticks = vlines[::3]  # plot every third elevation
             labels = numpy.round(self.sources[sourceidx, 1]*2, decimals=-1)/2
@@ -212,15 +227,8 @@ class HRTF():
             axis.text(x=xlim[0]+600, y=vlines[-1]+10+linesep/2,
                       s=str(linesep)+'dB', va='center', ha='left', fontsize=6, alpha=0.7)
         elif kind == 'image':
-            if not nbins:
-                img = numpy.zeros((self.data[sourceidx[0]].ntaps, len(sourceidx)))
-            else:
-                img = numpy.zeros((nbins, len(sourceidx)))
             elevations = self.sources[sourceidx, 1]
-            for idx, source in enumerate(sourceidx):
-                filt = self.data[source]
-                freqs, h = filt.tf(channels=chan, nbins=nbins, show=False)
-                img[:, idx] = h.flatten()
+            img = tfs[:, :, chan]
             img[img < -25] = -25  # clip at -40 dB transfer
             plt.contourf(freqs, elevations, img.T, cmap='hot', origin='upper', levels=20)
             plt.colorbar()
@@ -240,13 +248,8 @@ class HRTF():
         The filters for all sources are averaged, which yields an unbiased average only if the sources are uniformely
         distributed around the head. Returns the diffuse field average as FFR filter object.
         '''  # TODO: could make the contribution of each HRTF depend on local density of sources.
-        dfa = []
-        for source in range(self.nsources):
-            filt = self.data[source]
-            for chan in range(filt.nchannels):
-                _, h = filt.tf(channels=chan, show=False)
-                dfa.append(h)
-        dfa = 10 ** (numpy.mean(dfa, axis=0)/20)  # average and convert from dB to gain
+        _, tfs = self._transfer_functions()
+        dfa = 10 ** (tfs.reshape(len(tfs), -1).mean(axis=1)/20)  # average and convert from dB to gain
         return Filter(dfa, fir=False, samplerate=self.samplerate)
 
     def diffuse_field_equalization(self):
@@ -258,11 +261,10 @@ class HRTF():
         dfa.data = 1/dfa.data
         dtfs = copy.deepcopy(self)
         # apply the inverted filter to the HRTFs
+        _, tfs = self._transfer_functions()
+        tfs = 10 ** (tfs / 20) * dfa.data[:, :, numpy.newaxis]
         for source in range(dtfs.nsources):
-            filt = dtfs.data[source]
-            _, h = filt.tf(show=False)
-            h = 10 ** (h / 20) * dfa
-            dtfs.data[source] = Filter(data=h, fir=False, samplerate=self.samplerate)
+            dtfs.data[source] = Filter(data=tfs[:, source], fir=False, samplerate=self.samplerate)
         return dtfs
 
     def cone_sources(self, cone=0):
@@ -300,12 +302,8 @@ class HRTF():
         Extract transfer functions with `n_bins` from a list of source indices (`source_list`, generated for instance
         with :meth:`slab.HRTF.cone_sources`) as `(n_bins, n_sources)` numpy array.
         '''
-        n_sources = len(source_list)
-        tfs = numpy.zeros((n_bins, n_sources))
-        for idx, source in enumerate(source_list):
-            _, jwd = self.data[source].tf(channels=0, nbins=96, show=False)
-            tfs[:, idx] = jwd.flatten()
-        return tfs
+        _, tfs = self._transfer_functions(n_bins, source_list)
+        return tfs[:, :, 0]
 
     def vsi(self, sources=None, equalize=True):
         '''
@@ -4,6 +4,9 @@ Base class for Signal data (sounds and filters).
 
 import copy
 import warnings
+import fractions
+import functools
+import numbers
 import numpy
 try:
     import scipy.signal
@@ -11,7 +14,227 @@ try:
 except ImportError:
     have_scipy = False
 
+import slab.fft
+
 _default_samplerate = 8000  #: The default samplerate in Hz; used by all methods if on samplerate argument is provided.
+_default_dtype = numpy.dtype('float64')  #: The default sample type; used by all methods if no dtype argument is provided.
+_dtypes = (numpy.dtype('float32'), numpy.dtype('float64'))
+
+
+def _complex_dtype(dtype):
+    'Returns the complex type that matches the precision of the real sample type `dtype` (complex64 for float32).'
+    return numpy.result_type(dtype, numpy.complex64)
+
+
+_max_resampling_factor = 1000  #: Largest up- or downsampling factor for polyphase resampling, FFT resampling is used above
+
+
+def _resampling_factors(samplerate, new_samplerate):
+    'Returns the smallest integer up- and downsampling factors that convert `samplerate` to `new_samplerate`.'
+    ratio = fractions.Fraction(new_samplerate) / fractions.Fraction(samplerate)
+    return ratio.numerator, ratio.denominator
+
+
+@functools.lru_cache(maxsize=32)
+def _resampling_filter(up, down):
+    '''
+    Returns the anti-aliasing lowpass for polyphase resampling by `up`/`down`, designed like in
+    :func:`scipy.signal.resample_poly`. The design is cached, so that each pair of rates is designed only once.
+    '''
+    max_rate = max(up, down)
+    filt = scipy.signal.firwin(2 * 10 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0))
+    filt.flags.writeable = False  # shared between all calls
+    return filt
+
+
+_delay_degree = 12  #: Degree of the polynomial in the fractional delay that approximates the windowed sinc kernels
+
+
+@functools.lru_cache(maxsize=8)
+def _fractional_delay_kernels(filter_length):
+    '''
+    Returns Chebyshev coefficients with shape `(_delay_degree + 1, filter_length)` of the Hamming-windowed sinc
+    kernels as a function of the fractional delay f in [0, 1], mapped to the Chebyshev domain [-1, 1]. Evaluating
+    the series at f gives the kernel that delays by f samples (plus the centre tap). The coefficients are cached, so
+    that they are fitted only once for each filter length.
+    '''
+    shifts = numpy.linspace(0, 1, 4 * _delay_degree + 1)[:, numpy.newaxis]
+    x = numpy.arange(filter_length)[numpy.newaxis, :] - shifts
+    window = 0.54 - 0.46 * numpy.cos(2 * numpy.pi * (x + 0.5) / filter_length)  # Hamming window
+    kernels = window * numpy.sinc(x - filter_length // 2)
+    coefficients = numpy.polynomial.chebyshev.chebfit(2 * shifts[:, 0] - 1, kernels, _delay_degree)
+    coefficients.flags.writeable = False  # shared between all calls
+    return coefficients
+
+
+def _variable_delay(x, delays, filter_length):
+    '''
+    Delays the 1-D array `x` by a different, possibly fractional, number of samples `delays` at each sample, using
+    windowed sinc interpolation with `filter_length` taps. Like the original per-sample implementation of
+    :meth:`Signal.delay`, the output sample `i` is interpolated at `x[i - 1 - delays[i]]` and samples with a delay of
+    zero are passed unchanged. Instead of convolving each sample with its own kernel, the kernels are expanded into
+    a polynomial in the fractional delay (a Farrow structure): `x` is convolved once with each coefficient of the
+    polynomial and the outputs are combined sample by sample, which costs a few FFT convolutions in total.
+    '''
+    coefficients = _fractional_delay_kernels(filter_length)
+    whole = numpy.floor(delays)
+    fraction = 2 * (delays - whole) - 1  # in the Chebyshev domain
+    branches = scipy.signal.fftconvolve(x[:, numpy.newaxis], coefficients.T, axes=0)
+    # output i combines the branches at i - whole + centre_tap - 1, and is zero outside of the convolution
+    index = numpy.arange(len(x)) - whole.astype(int) + filter_length // 2 - 1
+    valid = (index >= 0) & (index < len(branches))
+    branches = branches[numpy.where(valid, index, 0)]
+    out = numpy.polynomial.chebyshev.chebval(fraction, branches.T, tensor=False)
+    out[~valid] = 0
+    still = numpy.abs(delays) < 1e-10
+    out[still] = x[still]
+    return out
+
+
+def _integer_delay(x, delay):
+    'Returns the 1-D array `x` shifted by the whole number of samples `delay`, padded with zeros.'
+    out = numpy.zeros_like(x)
+    if abs(delay) < len(x):
+        if delay >= 0:
+            out[delay:] = x[:len(x) - delay]
+        else:
+            out[:delay] = x[-delay:]
+    return out
+
+
+def _fractional_delays(x, delays, filter_length):
+    '''
+    Delays each column of the 2-D array `x` by the corresponding, possibly fractional, number of samples in `delays`.
+    Signals longer than `filter_length` are delayed in the frequency domain by multiplying their spectra with a linear
+    phase ramp. They are zero-padded before the transform, so that the delayed signal and the ringing of the ideal
+    interpolator do not wrap around. Shorter signals are convolved with a Hamming-windowed sinc kernel of
+    `filter_length` taps (which is reduced to the signal length).
+    '''
+    nsamples = x.shape[0]
+    if nsamples > filter_length:
+        padding = int(numpy.ceil(numpy.max(numpy.abs(delays)))) + filter_length // 2
+        length = slab.fft.next_fast_len(nsamples + 2 * padding)
+        padded = numpy.zeros((length, x.shape[1]))
+        padded[padding:padding + nsamples] = x
+        ramp = numpy.exp(-2j * numpy.pi * slab.fft.rfftfreq(length)[:, numpy.newaxis] * delays)
+        if length % 2 == 0:  # the Nyquist bin of a real signal is real, use the real part of the phase shift
+            ramp[-1] = ramp[-1].real
+        delayed = slab.fft.irfft(slab.fft.rfft(padded, axis=0) * ramp, length, axis=0)
+        return delayed[padding:padding + nsamples]
+    filter_length = min(filter_length, nsamples - nsamples % 2)  # the kernel must be even and fit into the signal
+    t = numpy.arange(filter_length)
+    out = numpy.empty_like(x, dtype=float)
+    for i, delay in enumerate(delays):
+        whole = int(numpy.floor(delay))
+        fraction = t - (delay - whole) + 1
+        window = 0.54 - 0.46 * numpy.cos(2 * numpy.pi * (fraction + 0.5) / filter_length)  # Hamming window
+        tap_weight = window * numpy.sinc(fraction - filter_length // 2)
+        out[:, i] = _integer_delay(numpy.convolve(x[:, i], tap_weight, mode='same'), whole)
+    return out
+
+
+@functools.lru_cache(maxsize=32)
+def _envelope_filter(samplerate):
+    'Returns the 50 Hz lowpass that removes the fine structure from Hilbert envelopes, designed once per samplerate.'
+    filt = scipy.signal.firwin(1000, 50, pass_zero=True, fs=samplerate)
+    filt.flags.writeable = False  # shared between all calls
+    return filt
+
+
+_direct_ntaps = 64  #: FIR filters with fewer taps are applied by direct convolution, longer ones via FFT
+
+
+def _convolve(x, filt, mode='full'):
+    '''
+    Convolves `x` along the first axis with the FIR filter `filt`. `filt` can be 1-D, or 2-D with one filter per
+    channel (the last axis of `x`), and filters and channels are broadcast against each other, so that a bank of
+    filters can be applied to a single channel. Short filters are applied by direct convolution, longer ones by
+    overlap-add FFT convolution, which is faster for filters with more than about `_direct_ntaps` taps.
+    '''
+    filt = numpy.asarray(filt)
+    if filt.ndim == 1:
+        filt = filt[:, numpy.newaxis]
+    filt = filt.reshape(filt.shape[:1] + (1,) * (x.ndim - 2) + filt.shape[1:])  # broadcast over the middle axes
+    if len(filt) >= _direct_ntaps:
+        return scipy.signal.oaconvolve(x, filt, mode=mode, axes=0)
+    out = None
+    shape = numpy.broadcast(numpy.empty(x.shape[1:]), numpy.empty(filt.shape[1:])).shape
+    for idx in numpy.ndindex(shape):
+        x_idx = tuple(min(i, n - 1) for i, n in zip(idx, x.shape[1:]))
+        filt_idx = tuple(min(i, n - 1) for i, n in zip(idx, filt.shape[1:]))
+        column = numpy.convolve(x[(slice(None),) + x_idx], filt[(slice(None),) + filt_idx], mode=mode)
+        if out is None:
+            out = numpy.empty(column.shape + shape, dtype=column.dtype)
+        out[(slice(None),) + idx] = column
+    return out
+
+
+def _along_first_axis(function, x, axis):
+    'Applies `function`, which filters along the first axis, to `x` along `axis`.'
+    return numpy.moveaxis(function(numpy.moveaxis(x, axis, 0)), 0, axis)
+
+
+def _filtfilt(filt, x, axis=0):
+    '''
+    Zero-phase filtering of `x` along `axis` with the FIR filter `filt`, equivalent to :func:`scipy.signal.filtfilt`
+    with odd padding of 3 * len(filt) samples (or less for short signals). The forward and backward passes are
+    convolutions (see :func:`_convolve`), with the initial filter state (the steady state for the first input sample)
+    represented by repeating that sample.
+    '''
+    def filtfilt(x):
+        padlen = min(3 * len(filt), x.shape[0] - 1)
+        extended = numpy.concatenate((2 * x[:1] - x[padlen:0:-1], x, 2 * x[-1:] - x[-2:-padlen-2:-1]))
+        for _ in range(2):  # forward pass, then backward pass on the reversed output
+            state = numpy.repeat(extended[:1], len(filt) - 1, axis=0)
+            extended = _convolve(numpy.concatenate((state, extended)), filt, mode='valid')[::-1]
+        return extended[padlen:len(extended) - padlen]
+    return _along_first_axis(filtfilt, x, axis)
+
+
+def _linear_phase_filter(filt, x, axis=0):
+    '''
+    Filters `x` along `axis` with a single pass of the FIR filter `filt` (see :func:`_convolve`) and removes the delay
+    of (len(filt)-1)//2 samples of a linear-phase (symmetric) filter, so that the output is aligned with `x`.
+    '''
+    def filtered(x):
+        delay = (len(filt) - 1) // 2
+        return _convolve(x, filt)[delay:delay + x.shape[0]]
+    return _along_first_axis(filtered, x, axis)
+
+
+def _hilbert_envelope(data, samplerate, kind='gain'):
+    'Returns the lowpass Hilbert envelopes of the columns of the 2-D array `data` in gain or dB (`kind`).'
+    if not have_scipy:
+        raise ImportError('Calculating envelopes requires scipy.signal.')
+    # the transform has the exact length of the data: zero-padding to a faster length would change the envelope at
+    # the edges, which wrap around in the analytic signal
+    envs = numpy.abs(scipy.signal.hilbert(data, axis=0))
+    # 50Hz lowpass filter to remove fine-structure
+    envs = _filtfilt(_envelope_filter(samplerate), envs)
+    envs[envs <= 0] = numpy.finfo(data.dtype).eps  # remove negative values and zeroes
+    if kind == 'dB':
+        envs = 20 * numpy.log10(envs)  # convert amplitude to dB
+    return envs
+
+
+def _envelope_gains(envelope, times, kind, duration, sample_times):
+    '''
+    Returns the `envelope` values (given at `times`, or spread evenly over `duration` if `times` is None) linearly
+    interpolated at `sample_times`, as gain factors.
+    '''
+    if times is None:
+        times = numpy.linspace(0, 1, len(envelope)) * duration
+    else:  # times vector was supplied
+        if len(times) != len(envelope):
+            raise ValueError('Envelope and times need to be of equal length!')
+        times = numpy.array(times)
+        times[times > duration] = duration  # clamp between 0 and sound duration
+        times[times < 0] = 0
+    # get an envelope value for each sample time
+    envelope = numpy.interp(sample_times, times, numpy.array(envelope))
+    if kind == 'dB':
+        envelope = 10**(envelope/20.)  # convert dB to gain factors
+    return envelope
 
 
 class Signal:
@@ -29,6 +252,10 @@ class Signal:
             for each element of the sequence.
         samplerate: samplerate of the signal; will use the default (for an array or function) or the samplerate of the
             data (for a filename)
+        dtype: sample type of the data, 'float32' or 'float64'; will use the default (see :meth:`set_default_dtype`)
+            for arrays and sequences, or keep the type of the data of a Signal object.
+        copy: if False and `data` is an array of the requested sample type, the array is used as data without copying
+            it, so that the Signal shares memory with the array (see also :meth:`from_array`).
 
     >>> import slab
     >>> import numpy
@@ -65,6 +292,12 @@ class Signal:
     >>> sig2 = sig * 2
     >>> sig2[-1,1]
     2.0
+
+    The augmented assignments (``+=``, ``-=``, ``*=``, ``/=``) modify the data of the signal in place without allocating a new array:
+
+    >>> sig2 += sig
+    >>> sig2[-1,1]
+    3.0
     '''
 
     # instance properties
@@ -78,27 +311,32 @@ class Signal:
                          doc='The number of channels in the Signal.')
 
     # __methods (class creation, printing, and slice functionality)
-    def __init__(self, data, samplerate=None):
+    def __init__(self, data, samplerate=None, dtype=None, copy=True):
         self.samplerate = Signal.get_samplerate(samplerate)
         if isinstance(data, numpy.ndarray):
-            self.data = numpy.array(data, dtype='float')
+            if copy:
+                self.data = numpy.array(data, dtype=Signal.get_dtype(dtype))
+            else:
+                self.data = numpy.asanyarray(data, dtype=Signal.get_dtype(dtype))  # keeps memmaps
         elif isinstance(data, (list, tuple)):
             kwds = {}
             if samplerate is not None:
                 kwds['samplerate'] = samplerate
-            channels = tuple(Signal(c, **kwds) for c in data)
+            channels = tuple(Signal(c, dtype=Signal.get_dtype(dtype), **kwds) for c in data)
             self.data = numpy.hstack(channels)
             self.samplerate = channels[0].samplerate
         # any object with data and samplerate attributes can be recast as Signal
         elif hasattr(data, 'data') and hasattr(data, 'samplerate'):
             self.data = data.data
+            if dtype is not None:
+                self.data = self.data.astype(Signal.get_dtype(dtype), copy=False)
             self.samplerate = data.samplerate
             if samplerate is not None:
                 warnings.warn('First argument has a samplerate property. Ignoring given samplerate.')
         else:
             raise TypeError('Cannot initialise Signal with data of class ' + str(data.__class__))
         if len(self.data.shape) == 1:
-            self.data.shape = (len(self.data), 1)
+            self.data = self.data[:, numpy.newaxis]  # reshape without changing the shape of a shared array
         elif self.data.shape[1] > self.data.shape[0]:
             self.data = self.data.T
 
@@ -115,46 +353,61 @@ class Signal:
         return self.data.__setitem__(key, value)
 
     # arithmetic operators
-    def __add__(self, other):
-        new = copy.deepcopy(self)
-        if isinstance(other, type(self)):
-            new.data = self.data + other.data
-        else:
-            new.data = self.data + other
+    # Out-of-place operators only copy the metadata of the object (via a shallow copy) and attach the newly computed
+    # array. In-place operators write into the existing data array when the result fits into it.
+    def _new_from_data(self, data):
+        'Returns a shallow copy of the object with `data` as its data array.'
+        new = copy.copy(self)
+        new.data = data
         return new
+
+    def _inplace(self, other, operation):
+        if isinstance(other, Signal):
+            other = other.data
+        try:
+            operation(self.data, other, out=self.data)
+        except (ValueError, TypeError):  # result does not fit into the data array (shape or dtype), reallocate
+            self.data = operation(self.data, other)
+        return self
+
+    def __add__(self, other):
+        if isinstance(other, Signal):
+            return self._new_from_data(self.data + other.data)
+        return self._new_from_data(self.data + other)
     __radd__ = __add__
 
     def __sub__(self, other):
-        new = copy.deepcopy(self)
-        if isinstance(other, type(self)):
-            new.data = self.data - other.data
-        else:
-            new.data = self.data - other
-        return new
+        if isinstance(other, Signal):
+            return self._new_from_data(self.data - other.data)
+        return self._new_from_data(self.data - other)
     __rsub__ = __sub__
 
     def __mul__(self, other):
-        new = copy.deepcopy(self)
-        if isinstance(other, type(self)):
-            new.data = self.data * other.data
-        else:
-            new.data = self.data * other
-        return new
+        if isinstance(other, Signal):
+            return self._new_from_data(self.data * other.data)
+        return self._new_from_data(self.data * other)
     __rmul__ = __mul__
 
     def __truediv__(self, other):
-        new = copy.deepcopy(self)
-        if isinstance(other, type(self)):
-            new.data = self.data / other.data
-        else:
-            new.data = self.data / other
-        return new
+        if isinstance(other, Signal):
+            return self._new_from_data(self.data / other.data)
+        return self._new_from_data(self.data / other)
     __rtruediv__ = __truediv__
 
     def __neg__(self):
-        new = copy.deepcopy(self)
-        new.data = self.data*-1
-        return new
+        return self._new_from_data(-self.data)
+
+    def __iadd__(self, other):
+        return self._inplace(other, numpy.add)
+
+    def __isub__(self, other):
+        return self._inplace(other, numpy.subtract)
+
+    def __imul__(self, other):
+        return self._inplace(other, numpy.multiply)
+
+    def __itruediv__(self, other):
+        return self._inplace(other, numpy.true_divide)
 
     def __len__(self):
         return self.nsamples
@@ -200,16 +453,73 @@ class Signal:
         global _default_samplerate
         _default_samplerate = samplerate
 
+    @staticmethod
+    def get_dtype(dtype):
+        'Return the sample type `dtype` as numpy.dtype if supplied, otherwise return the default sample type.'
+        if dtype is None:
+            return _default_dtype
+        dtype = numpy.dtype(dtype)
+        if dtype not in _dtypes:
+            raise ValueError(f'Unsupported sample type {dtype} (must be float32 or float64).')
+        return dtype
+
+    @staticmethod
+    def set_default_dtype(dtype):
+        '''
+        Sets the global default sample type for Signal objects, by default 'float64'. With 'float32', sounds, filters
+        and HRTFs use half the memory, and spectra computed internally (for instance in :meth:`Filter.apply`) are
+        complex64. Single precision keeps 24 bits of mantissa: each sample carries a relative rounding error of at
+        most 6e-8 (about -144 dB), which is below the noise floor of 24 bit audio. FFT-based operations accumulate an
+        rms error of roughly 6e-8 * log2(nsamples) relative to the rms of the signal, i.e. around 1e-6 (-120 dB) for
+        sounds of several minutes, and computed levels deviate by less than 1e-4 dB from the double precision values.
+        Use 'float64' for analyses that need a larger dynamic range.
+        '''
+        global _default_dtype
+        _default_dtype = Signal.get_dtype(dtype)
+
+    @staticmethod
+    def set_fft_workers(workers):
+        '''
+        Sets the number of threads used by the Fourier transforms of all methods (for instance :meth:`Filter.apply`
+        and :meth:`Sound.spectrum`), by default None (one thread). -1 uses all processors. Transforms of
+        multi-channel signals and filter banks are split between the threads. Requires Scipy; without Scipy, the
+        transforms are computed with numpy.fft in one thread.
+        '''
+        slab.fft.set_workers(workers)
+
+    @classmethod
+    def from_array(cls, data, samplerate=None, copy=False, dtype=None):
+        '''
+        Returns an object of the calling class with the array `data` as samples. By default, the array is not copied
+        and the object shares memory with it, unless a conversion to `dtype` is necessary. If `dtype` is None, float32
+        and float64 arrays keep their sample type and other arrays are converted to the default sample type.
+
+        >>> data = numpy.zeros((8000, 2))
+        >>> sig = slab.Signal.from_array(data, samplerate=8000)
+        >>> sig.data is data
+        True
+        '''
+        if dtype is None:
+            array_dtype = numpy.asarray(data).dtype
+            if array_dtype in _dtypes:
+                dtype = array_dtype
+        return cls(data, samplerate=samplerate, dtype=dtype, copy=copy)
+
     # instance methods (belong to instances created from the class)
+    def astype(self, dtype):
+        'Returns a copy of the object with the data converted to the sample type `dtype` (\'float32\' or \'float64\').'
+        return self._new_from_data(self.data.astype(Signal.get_dtype(dtype)))
+
     def channel(self, n):
-        'Returns the nth channel as new object of the calling class.'
-        new = copy.deepcopy(self)
-        new.data = self.data[:, n]
-        new.data.shape = (len(new.data), 1)
-        return new
+        '''
+        Returns the nth channel as new object of the calling class. The data of the returned object is a view of the
+        nth column of the data (no samples are copied), so that changing the samples of the channel also changes the
+        original object. Use `copy.deepcopy(sig.channel(n))` to get an independent object.
+        '''
+        return self._new_from_data(self.data[:, n:n+1])
 
     def channels(self):
-        'Returns generator that yields channel data as objects of the calling class.'
+        'Returns generator that yields channel data as objects of the calling class (views, see :meth:`channel`).'
         return (self.channel(i) for i in range(self.nchannels))
 
     def resize(self, L):
@@ -224,21 +534,26 @@ class Signal:
             self.data = numpy.concatenate((self.data, padding))
 
     def resample(self, samplerate):
-        'Returns a resampled version of the sound. Requires scipy.signal.'
+        '''
+        Returns a resampled version of the sound. Requires scipy.signal. All channels are resampled at once with a
+        polyphase filter (:func:`scipy.signal.resample_poly`) if the ratio of the samplerates can be expressed with
+        factors up to 1000 (like 160/147 for 44100 to 48000 Hz), otherwise in the frequency domain. The filter for each
+        pair of samplerates is designed only once. Use :class:`Resampler` to resample a signal block by block.
+        '''
         if not have_scipy:
             raise ImportError('Resampling requires scipy.signal.')
         if self.samplerate == samplerate:
             return self
-        else:
-            out = copy.deepcopy(self)
-            new_nsamples = int(numpy.rint(samplerate*self.duration))
-            new_signal = numpy.zeros((new_nsamples, self.nchannels))
-            for chan in range(self.nchannels):
-                new_signal[:, chan] = scipy.signal.resample(
-                    self.channel(chan), new_nsamples).flatten()
-            out.data = new_signal
-            out.samplerate = samplerate
-            return out
+        new_nsamples = int(numpy.rint(samplerate*self.duration))
+        up, down = _resampling_factors(self.samplerate, samplerate)
+        if max(up, down) <= _max_resampling_factor:
+            new_signal = scipy.signal.resample_poly(self.data, up, down, axis=0, window=_resampling_filter(up, down))
+        else:  # the polyphase filter would be too long
+            new_signal = scipy.signal.resample(self.data, new_nsamples, axis=0)
+        out = self._new_from_data(new_signal.astype(self.data.dtype, copy=False))
+        out.samplerate = samplerate
+        out.resize(new_nsamples)  # polyphase resampling may return one sample more
+        return out
 
     def envelope(self, envelope=None, times=None, kind='gain'):
         '''
@@ -254,75 +569,281 @@ class Signal:
         > sig.waveform()
         '''
         if envelope is None:  # no envelope supplied, compute Hilbert envelope
-            if not have_scipy:
-                raise ImportError('Calculating envelopes requires scipy.signal.')
-            envs = numpy.abs(scipy.signal.hilbert(self.data, axis=0))
-            # 50Hz lowpass filter to remove fine-structure
-            filt = scipy.signal.firwin(1000, 50, pass_zero=True, fs=self.samplerate)
-            envs = scipy.signal.filtfilt(filt, [1], envs, axis=0)
-            envs[envs <= 0] = numpy.finfo(float).eps  # remove negative values and zeroes
-            if kind == 'dB':
-                envs = 20 * numpy.log10(envs)  # convert amplitude to dB
-            new = Signal(envs, samplerate=self.samplerate)
+            envs = _hilbert_envelope(self.data, self.samplerate, kind)
+            new = Signal(envs, samplerate=self.samplerate, dtype=self.data.dtype, copy=False)
         else:  # envelope supplied, generate new signal
             new = copy.deepcopy(self)
-            if times is None:
-                times = numpy.linspace(0, 1, len(envelope)) * self.duration
-            else:  # times vector was supplied
-                if len(times) != len(envelope):
-                    raise ValueError('Envelope and times need to be of equal length!')
-                times = numpy.array(times)
-                times[times > self.duration] = self.duration  # clamp between 0 and sound duration
-                times[times < 0] = 0
-            # get an envelope value for each sample time
-            envelope = numpy.interp(self.times, times, numpy.array(envelope))
-            if kind == 'dB':
-                envelope = 10**(envelope/20.)  # convert dB to gain factors
-            new.data *= envelope[:, numpy.newaxis]  # multiply
+            new.data *= _envelope_gains(envelope, times, kind, self.duration, self.times)[:, numpy.newaxis]  # multiply
         return new
 
     def delay(self, duration=1, channel=0, filter_length=2048):
         '''
-        Delays one `channel` by `duration` (in seconds if float, or samples if int). If duration is a vector with
-        self.nsamples entries, then each sample is delayed by the corresponsding number of seconds. This option is used
-        by the :meth:`Binaural.itd_ramp`. `filter_length` determines the accuracy of the reconstruction when
-        using fractional sample delays and is 2048, or the signal length for shorter signals.
+        Delays one `channel` by `duration` (in seconds if float, or samples if int). Whole numbers of samples are
+        shifted exactly; fractional delays are applied with a linear phase ramp in the frequency domain, or with
+        a windowed sinc filter of `filter_length` taps for signals that are shorter than the filter. `channel` can
+        also be a list of channels, which are delayed together, and `duration` a list with one delay per channel.
+        Negative delays advance the channel. If duration is a vector with self.nsamples entries, then each sample is
+        delayed by the corresponding number of seconds. This option is used by the :meth:`Binaural.itd_ramp`.
+        `filter_length` determines the accuracy of the reconstruction when using time-varying fractional sample delays
+        and is 2048, or the signal length for shorter signals.
+
+        >>> sig = Signal(numpy.random.randn(1000, 2), samplerate=44100)
+        >>> sig.delay(duration=[5, 0.0001], channel=[0, 1]) # 5 samples and 4.41 samples
         '''
-        if channel >= self.nchannels:
+        channels = numpy.atleast_1d(channel)
+        if numpy.any(channels >= self.nchannels):
             raise ValueError('Channel must be smaller than number of channels in signal!')
         if filter_length % 2:
             raise ValueError('Filter_length must be even!')
+        if numpy.ndim(channel) or isinstance(duration, numbers.Number):  # constant delays
+            durations = numpy.broadcast_to(numpy.array(duration, dtype=object), channels.shape)
+            delays = numpy.array([d if isinstance(d, numbers.Integral) else d * self.samplerate for d in durations],
+                                 dtype=float)
+            whole = numpy.rint(delays)
+            exact = numpy.abs(delays - whole) < 1e-10
+            for chan, delay in zip(channels[exact], whole[exact]):
+                if delay:
+                    self.data[:, chan] = _integer_delay(self.data[:, chan], int(delay))
+            if not numpy.all(exact):
+                fractional = channels[~exact]
+                self.data[:, fractional] = _fractional_delays(self.data[:, fractional], delays[~exact], filter_length)
+            return
         if self.nsamples < filter_length:  # reduce the filter_length to the signal length of short signals
             filter_length = self.nsamples-1 if self.nsamples % 2 else self.nsamples  # make even
-        centre_tap = int(filter_length / 2)
-        t = numpy.array(range(filter_length))
-        if isinstance(duration, (int, float, numpy.int64, numpy.float64)):  # just a constant delay
-            duration = Signal.in_samples(duration, self.samplerate)
-            x = t - duration + 1
-            window = 0.54 - 0.46 * numpy.cos(2 * numpy.pi * (x+0.5) /
-                                             filter_length)  # Hamming window
-            if numpy.abs(duration) < 1e-10:
-                tap_weight = numpy.zeros_like(t)
-                tap_weight[centre_tap] = 1
-            else:
-                tap_weight = window * numpy.sinc(x-centre_tap)
-            self.data[:, channel] = numpy.convolve(self.data[:, channel], tap_weight, mode='same')
-        else:  # dynamic delay
-            if len(duration) != self.nsamples:
-                ValueError('Duration shorter or longer than signal!')
-            duration *= self.samplerate  # assuming vector in seconds, convert to samples
-            padding = numpy.zeros(centre_tap)
-            # for zero-padded convolution (potential edge artifacts!)
-            sig = numpy.concatenate((padding, self.channel(channel), padding), axis=None)
-            for i, current_delay in enumerate(duration):
-                x = t-current_delay
-                window = 0.54 - 0.46 * numpy.cos(2 * numpy.pi *
-                                                 (x+0.5) / filter_length)  # Hamming window
-                if numpy.abs(current_delay) < 1e-10:
-                    tap_weight = numpy.zeros_like(t)
-                    tap_weight[centre_tap] = 1
-                else:
-                    tap_weight = window * numpy.sinc(x-centre_tap)
-                    sig_portion = sig[i:i+filter_length]
-                    # sig_portion and tap_weight have the same length, so the valid part of the convolution is just one sample, which gets written into the signal at the current index
-                    self.data[i, channel] = numpy.convolve(sig_portion, tap_weight, mode='valid')
+        duration = numpy.asarray(duration, dtype=float)  # dynamic delay
+        if len(duration) != self.nsamples:
+            raise ValueError('Duration shorter or longer than signal!')
+        duration = duration * self.samplerate  # assuming vector in seconds, convert to samples
+        self.data[:, channel] = _variable_delay(self.data[:, channel], duration, filter_length)
+
+
+class SignalBatch:
+    '''
+    Stack of signals with the same number of samples and channels and the same samplerate, for instance a list of
+    precomputed stimuli. The samples of all signals are kept in one array with shape `(nitems, nsamples, nchannels)`,
+    so that methods process the whole batch at once instead of looping over the signals in Python.
+    Indexing a batch with an integer returns the signal at that position (slices return batches), iterating over a
+    batch or calling :meth:`to_list` returns all signals. These signals are views of the batch: their data is part of
+    the batch data, and changing one changes the other.
+
+    Arguments:
+        data: samples of the signals with shape `(nitems, nsamples, nchannels)` or `(nitems, nsamples)`, or a sequence
+            of Signal objects (or subclasses) with equal length and number of channels.
+        samplerate: samplerate of the signals; will use the samplerate of the signals in a sequence, or the default.
+        dtype: sample type, 'float32' or 'float64'; uses the common type of the signals in a sequence, or the default
+            type (see :meth:`Signal.set_default_dtype`) for arrays, if None.
+        copy: whether to copy a data array. A batch made from a sequence of signals always holds a new array.
+
+    >>> sounds = [slab.Sound.tone(frequency=f) for f in (500, 1000, 2000)]
+    >>> batch = slab.SoundBatch(sounds)
+    >>> batch.level = 70  # sets the level of all sounds
+    >>> sounds = batch.to_list()
+    '''
+    _item_type = Signal  # class of the signals returned by indexing, replaced by the class of the signals in a sequence
+
+    # instance properties
+    nitems = property(fget=lambda self: self.data.shape[0], doc='The number of signals in the batch.')
+    nsamples = property(fget=lambda self: self.data.shape[1], doc='The number of samples in each signal.')
+    nchannels = property(fget=lambda self: self.data.shape[2], doc='The number of channels of each signal.')
+    duration = property(fget=lambda self: self.data.shape[1] / self.samplerate,
+                        doc='The length of the signals in seconds.')
+    times = property(fget=lambda self: numpy.arange(self.data.shape[1], dtype=float) / self.samplerate,
+                     doc='An array of times (in seconds) corresponding to each sample.')
+
+    def __init__(self, data, samplerate=None, dtype=None, copy=True):
+        if isinstance(data, (list, tuple)):
+            if not data:
+                raise ValueError('Cannot make a batch of an empty sequence.')
+            if len({item.samplerate for item in data}) > 1:
+                raise ValueError('All signals in a batch must have the same samplerate.')
+            if samplerate is not None and samplerate != data[0].samplerate:
+                raise ValueError('Cannot specify a samplerate different from the samplerate of the signals.')
+            if len({item.data.shape for item in data}) > 1:
+                raise ValueError('All signals in a batch must have the same number of samples and channels.')
+            samplerate = data[0].samplerate
+            self._item_type = type(data[0])
+            data = numpy.stack([item.data for item in data])
+            copy = False  # stacking already made a new array
+            if dtype is None:  # like Signals made from Signals, keep the sample type (the common type of the signals)
+                dtype = data.dtype
+        self.samplerate = Signal.get_samplerate(samplerate)
+        if copy:
+            self.data = numpy.array(data, dtype=Signal.get_dtype(dtype))
+        else:
+            self.data = numpy.asanyarray(data, dtype=Signal.get_dtype(dtype))
+        if self.data.ndim == 2:
+            self.data = self.data[:, :, numpy.newaxis]  # single-channel signals
+        if self.data.ndim != 3:
+            raise ValueError('Batch data must have shape (nitems, nsamples, nchannels).')
+
+    def __repr__(self):
+        return f'{type(self)} (\n{repr(self.data)}\n{repr(self.samplerate)})'
+
+    def __str__(self):
+        return f'{type(self)} items {self.nitems}, duration {self.duration}, samples {self.nsamples}, ' \
+               f'channels {self.nchannels}, samplerate {self.samplerate}'
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, numpy.integer)):
+            return self._item_type(self.data[key], samplerate=self.samplerate, dtype=self.data.dtype, copy=False)
+        return self._new_from_data(self.data[key])
+
+    def __setitem__(self, key, value):
+        self.data[key] = getattr(value, 'data', value)
+
+    def __iter__(self):
+        for i in range(self.nitems):
+            yield self[i]
+
+    def _new_from_data(self, data):
+        'Returns a shallow copy of the batch with `data` as its data array.'
+        new = copy.copy(self)
+        new.data = data
+        return new
+
+    def to_list(self):
+        'Returns a list of the signals in the batch. The signals are views of the batch (no samples are copied).'
+        return list(self)
+
+    def envelope(self, envelope=None, times=None, kind='gain'):
+        '''
+        Returns the Hilbert envelopes of all signals as new batch, or applies the same `envelope` to all signals, like
+        :meth:`Signal.envelope`.
+        '''
+        if envelope is None:
+            # envelopes of all channels of all signals at once, with time along the first axis
+            envs = self.data.transpose(1, 0, 2).reshape(self.nsamples, -1)
+            envs = _hilbert_envelope(envs, self.samplerate, kind)
+            envs = envs.reshape(self.nsamples, self.nitems, self.nchannels).transpose(1, 0, 2)
+            return SignalBatch(envs, samplerate=self.samplerate, dtype=self.data.dtype, copy=False)
+        gains = _envelope_gains(envelope, times, kind, self.duration, self.times)
+        return self._new_from_data(self.data * gains[:, numpy.newaxis])
+
+
+class Resampler:
+    '''
+    Polyphase resampler for signals that arrive in blocks, for instance when processing recordings that are too long
+    to fit into memory, or when streaming to a soundcard. The filter is the same as in :meth:`Signal.resample`, and the
+    concatenated outputs of :meth:`process` followed by :meth:`flush` equal the output of :meth:`Signal.resample` on
+    the whole signal. Because the filter is symmetric around each output sample, an output sample is only returned
+    once the input samples up to `latency` seconds after it have been processed.
+
+    Arguments:
+        samplerate: samplerate of the input blocks
+        new_samplerate: samplerate of the output blocks
+        nchannels: number of channels of the blocks
+
+    >>> resampler = Resampler(44100, 48000, nchannels=2)
+    >>> out = [resampler.process(block) for block in blocks]  # blocks of shape (nsamples, 2)
+    >>> out.append(resampler.flush())
+    >>> resampled = Signal(numpy.concatenate(out), samplerate=48000)
+    '''
+
+    def __init__(self, samplerate, new_samplerate, nchannels=1):
+        if not have_scipy:
+            raise ImportError('Resampling requires scipy.signal.')
+        self.samplerate = samplerate
+        self.new_samplerate = new_samplerate
+        self.nchannels = nchannels
+        self.up, self.down = _resampling_factors(samplerate, new_samplerate)
+        if max(self.up, self.down) > _max_resampling_factor:
+            raise ValueError(f'Cannot resample from {samplerate} to {new_samplerate} Hz block by block.')
+        filt = _resampling_filter(self.up, self.down) * self.up
+        self._half_len = (len(filt) - 1) // 2  # delay of the filter in upsampled samples
+        ntaps = -(-len(filt) // self.up)  # taps per phase
+        filt = numpy.concatenate((filt, numpy.zeros(ntaps * self.up - len(filt))))
+        self._phases = filt.reshape(ntaps, self.up).T  # phase p holds the taps filt[p::up]
+        self._history = numpy.zeros((ntaps - 1, nchannels))  # the last input samples needed for the next block
+        self._ninput = 0  # number of input samples processed so far
+        self._noutput = 0  # number of output samples returned so far
+        self.latency = (self._half_len / self.up) / samplerate
+
+    def _outputs(self, block, last_output):
+        'Filters the buffered input followed by `block` and returns the output samples up to `last_output`.'
+        ntaps = self._phases.shape[1]
+        buffer = numpy.concatenate((self._history, block))
+        buffer_start = self._ninput - (ntaps - 1)  # absolute index of the first sample in the buffer
+        self._ninput += len(block)
+        self._history = buffer[len(buffer) - (ntaps - 1):]
+        # output m is centered on sample m*down in the upsampled signal, the filter reaches half_len samples ahead
+        last_output = min(last_output, (self._ninput * self.up - 1 - self._half_len) // self.down)
+        outputs = numpy.arange(self._noutput, last_output + 1)
+        upsampled = outputs * self.down + self._half_len
+        idx = upsampled // self.up - buffer_start  # newest input sample contributing to each output
+        taps = self._phases[upsampled % self.up]  # (noutputs x ntaps)
+        samples = buffer[idx[:, numpy.newaxis] - numpy.arange(ntaps)]  # (noutputs x ntaps x nchannels)
+        self._noutput += len(outputs)
+        return numpy.einsum('ot,otc->oc', taps, samples)
+
+    def process(self, block):
+        '''
+        Resample the next block of input samples (array or Signal with shape (nsamples, nchannels)) and return all
+        output samples that can be computed so far as array.
+        '''
+        block = numpy.asarray(getattr(block, 'data', block), dtype=float).reshape(-1, self.nchannels)
+        return self._outputs(block, numpy.inf)
+
+    def flush(self):
+        'Returns the remaining output samples, assuming that the input signal is followed by silence.'
+        total = -(-self._ninput * self.up // self.down)  # total number of output samples of the input signal
+        ntaps = self._phases.shape[1]
+        padding = numpy.zeros((ntaps + self._half_len // self.up + 1, self.nchannels))
+        return self._outputs(padding, total - 1)
+
+
+class EnvelopeFollower:
+    '''
+    Computes the lowpass Hilbert envelope of a signal that arrives in blocks, for instance a recording that is too
+    long for one Hilbert transform. The analytic signal is approximated with a Hamming-windowed FIR Hilbert
+    transformer of `filter_length` taps (odd), and the fine structure is removed with the same 50 Hz lowpass as in
+    :meth:`Signal.envelope`. Both filters are causal, so the envelope lags the input by `latency` seconds. Apart from
+    this lag and the poorer approximation below samplerate / filter_length Hz, the output follows
+    :meth:`Signal.envelope`.
+
+    Arguments:
+        samplerate: samplerate of the input blocks
+        nchannels: number of channels of the blocks
+        kind: 'gain' or 'dB', the unit of the returned envelope values
+        filter_length: number of taps of the Hilbert transformer
+
+    >>> follower = EnvelopeFollower(44100, nchannels=2)
+    >>> envs = [follower.process(block) for block in blocks]  # blocks of shape (nsamples, 2)
+    '''
+
+    def __init__(self, samplerate, nchannels=1, kind='gain', filter_length=1001):
+        if not have_scipy:
+            raise ImportError('Calculating envelopes requires scipy.signal.')
+        if not filter_length % 2:
+            raise ValueError('Filter_length must be odd!')
+        self.samplerate = samplerate
+        self.nchannels = nchannels
+        self.kind = kind
+        half = filter_length // 2
+        k = numpy.arange(-half, half + 1)
+        hilbert = numpy.zeros(filter_length)
+        hilbert[k % 2 == 1] = 2 / (numpy.pi * k[k % 2 == 1])  # ideal Hilbert transformer
+        self._hilbert = hilbert * numpy.hamming(filter_length)
+        self._lowpass = _envelope_filter(samplerate)
+        self._real_state = numpy.zeros((half, nchannels))  # delays the real part like the Hilbert transformer
+        self._hilbert_state = numpy.zeros((filter_length - 1, nchannels))
+        self._lowpass_state = numpy.zeros((len(self._lowpass) - 1, nchannels))
+        self.latency = (half + (len(self._lowpass) - 1) / 2) / samplerate
+
+    def process(self, block):
+        '''
+        Returns the envelope of the next block of input samples (array or Signal with shape (nsamples, nchannels))
+        as array of the same shape.
+        '''
+        block = numpy.asarray(getattr(block, 'data', block), dtype=float).reshape(-1, self.nchannels)
+        delayed = numpy.concatenate((self._real_state, block))
+        self._real_state = delayed[len(block):]
+        imag, self._hilbert_state = scipy.signal.lfilter(self._hilbert, [1], block, axis=0, zi=self._hilbert_state)
+        envs = numpy.sqrt(delayed[:len(block)]**2 + imag**2)
+        envs, self._lowpass_state = scipy.signal.lfilter(self._lowpass, [1], envs, axis=0, zi=self._lowpass_state)
+        envs[envs <= 0] = numpy.finfo(float).eps  # remove negative values and zeroes
+        if self.kind == 'dB':
+            envs = 20 * numpy.log10(envs)  # convert amplitude to dB
+        return envs
@@ -1,6 +1,7 @@
 import time
 import pathlib
 import tempfile
+import struct
 import numpy
 import copy
 
@@ -26,12 +27,14 @@ try:
 except ImportError:
     have_pyplot = False
 
-from slab.signal import Signal
+import slab.fft
+from slab.signal import Signal, SignalBatch, _envelope_gains
 from slab.filter import Filter
 from slab import DATAPATH
 
 # get a temporary directory for writing intermediate files
 _tmpdir = pathlib.Path(tempfile.gettempdir())
+_block_nsamples = 2**16  #: Number of samples processed at a time by methods that step through long (memory-mapped) sounds
 
 try:  # try getting a previously set calibration intensity from file
     _calibration_intensity = numpy.load(DATAPATH + 'calibration_intensity.npy')
@@ -39,6 +42,26 @@ except FileNotFoundError:
     _calibration_intensity = 0  #: Difference between rms intensity and measured output intensity in dB
 
 
+def _blockwise_rms(blocks, nchannels):
+    '''
+    Returns the rms (standard deviation) of each channel of a signal given as iterable of blocks with shape
+    (nsamples, nchannels). The block means and sums of squared deviations are combined (Chan et al., 1979), so that
+    each block is read only once.
+    '''
+    count = 0
+    mean = numpy.zeros(nchannels)
+    sum_sq = numpy.zeros(nchannels)
+    for block in blocks:
+        block_mean = numpy.mean(block, axis=0, dtype=float)
+        block_sum_sq = numpy.sum(numpy.square(block - block_mean), axis=0)
+        delta = block_mean - mean
+        total = count + len(block)
+        mean += delta * len(block) / total
+        sum_sq += block_sum_sq + delta**2 * count * len(block) / total
+        count = total
+    return numpy.sqrt(sum_sq / max(count, 1))
+
+
 class Sound(Signal):
     '''
     Class for working with sounds, including loading/saving, manipulating and playing.
@@ -81,16 +104,14 @@ class Sound(Signal):
         In the case of multi-channel sounds, returns an array of levels
         for each channel, otherwise returns a float.
         '''
+        # step through the sound in blocks, so that long or memory-mapped sounds are never copied as a whole
+        blocks = (self.data[start:start+_block_nsamples] for start in range(0, self.nsamples, _block_nsamples))
+        rms_value = _blockwise_rms(blocks, self.nchannels)
+        with numpy.errstate(divide='ignore'):
+            rms_dB = numpy.where(rms_value == 0, 0, 20.0*numpy.log10(rms_value/2e-5))
         if self.nchannels == 1:
-            rms_value = numpy.sqrt(numpy.mean(numpy.square(self.data-numpy.mean(self.data))))
-            if rms_value == 0:
-                rms_dB = 0
-            else:
-                rms_dB = 20.0*numpy.log10(rms_value/2e-5)
-            return rms_dB + _calibration_intensity
-        chans = self.channels()
-        levels = [c.level for c in chans]
-        return numpy.array(levels)
+            return rms_dB[0] + _calibration_intensity
+        return rms_dB + _calibration_intensity
 
     def _set_level(self, level):
         '''
@@ -115,30 +136,77 @@ class Sound(Signal):
     :meth:`slab.Sound.calibrate` to make the computed level reflect output intensity.
     ''')
 
-    def __init__(self, data, samplerate=None):
+    def __init__(self, data, samplerate=None, dtype=None, copy=True):
         if isinstance(data, pathlib.Path):  # Sound initialization from a file name (pathlib object)
             data = str(data)
         if isinstance(data, str):  # Sound initialization from a file name (string)
             if samplerate is not None:
                 raise ValueError('Cannot specify samplerate when initialising Sound from a file.')
-            _ = Sound.read(data)
+            _ = Sound.read(data, dtype=dtype)
             self.data = _.data
             self.samplerate = _.samplerate
         else:
             # delegate to the baseclass init
-            super().__init__(data, samplerate)
+            super().__init__(data, samplerate, dtype, copy)
 
     # static methods (creating sounds)
     @staticmethod
-    def read(filename):
+    def read(filename, dtype=None, mmap=False):
         '''
-        Load the file given by filename (.wav) and returns a Sound object.
+        Load the file given by filename (.wav) and returns a Sound object. The samples are read as `dtype`
+        (defaults to the type set with :meth:`slab.Signal.set_default_dtype`). If `mmap` is True, the samples are not
+        read but memory-mapped (see :meth:`memmap`) and keep the sample type of the file, so `dtype` cannot be given.
         '''
+        if mmap:
+            if dtype is not None:
+                raise ValueError('Memory-mapped samples keep the sample type of the file, dtype cannot be given.')
+            return Sound.memmap(filename)
         if not have_soundfile:
             raise ImportError(
                 'Reading wav files requires SoundFile (pip install git+https://github.com/bastibe/SoundFile.git')
-        data, samplerate = soundfile.read(filename)
-        return Sound(data, samplerate=samplerate)
+        dtype = Sound.get_dtype(dtype)
+        data, samplerate = soundfile.read(filename, dtype=dtype.name)
+        return Sound(data, samplerate=samplerate, dtype=dtype, copy=False)
+
+    @staticmethod
+    def memmap(filename, samplerate=None, nchannels=1, dtype=None, offset=0, mode='r'):
+        '''
+        Returns a Sound whose data is a :class:`numpy.memmap` of the samples in a file, so that the file is not loaded
+        into memory. Only the parts of the file that are accessed (for instance by slicing, or by stepping through the
+        sound with :meth:`frames`) are read from disk. Computing the `level` and the `spectrum`, and applying filters
+        (:meth:`slab.Filter.apply`) process the sound in blocks or channel by channel, so that only the result and one
+        block or channel are held in memory. Methods that return a modified copy of the sound (like :meth:`ramp`) load the whole file.
+
+        Arguments:
+            filename: a WAV file with floating point samples, a .npy file, or any other file, which is read as raw
+                interleaved samples of type `dtype` with `nchannels` channels, starting at byte `offset`.
+            samplerate: samplerate of the sound (the samplerate of WAV files is read from the file).
+            nchannels, dtype, offset: layout of raw sample files; `dtype` defaults to the default sample type.
+            mode: mode of the memory map, 'r' (read-only), 'r+' (changes are written to the file), or 'c' (changes
+                are kept in memory only).
+
+        Integer (PCM) samples are not supported, because they would have to be read and scaled to floating point.
+        Convert such files once, for instance with `Sound.read(filename).write(new_filename, subtype='FLOAT')`.
+
+        >>> long_recording = Sound.memmap('recording.wav')
+        >>> excerpt = long_recording[44100*3600:44100*3601]  # reads only one second from disk
+        '''
+        filename = str(filename)
+        suffix = pathlib.Path(filename).suffix.lower()
+        if suffix == '.npy':
+            data = numpy.load(filename, mmap_mode=mode)
+        elif suffix == '.wav':
+            dtype, nchannels, samplerate, offset, nframes = _wav_layout(filename)
+            data = numpy.memmap(filename, dtype=dtype, mode=mode, offset=offset, shape=(nframes, nchannels))
+        else:
+            dtype = Sound.get_dtype(dtype)
+            nframes = (pathlib.Path(filename).stat().st_size - offset) // (dtype.itemsize * nchannels)
+            data = numpy.memmap(filename, dtype=dtype, mode=mode, offset=offset, shape=(nframes, nchannels))
+        if data.dtype not in (numpy.float32, numpy.float64):
+            raise ValueError(f'Cannot memory-map samples of type {data.dtype}, only float32 and float64.')
+        if data.ndim == 1:
+            data = data[:, numpy.newaxis]
+        return Sound.from_array(data, samplerate=samplerate)
 
     @staticmethod
     def tone(frequency=500, duration=1., phase=0, samplerate=None, nchannels=1):
@@ -165,7 +233,7 @@ class Sound(Signal):
         t = numpy.arange(0, duration, 1)/samplerate
         t.shape = (t.size, 1)  # ensures C-order
         x = numpy.sin(phase + 2*numpy.pi * frequency * numpy.tile(t, (1, nchannels)))
-        return Sound(x, samplerate)
+        return Sound(x, samplerate, copy=False)
 
     @staticmethod
     def harmoniccomplex(f0=500, duration=1., amplitude=0, phase=0, samplerate=None, nchannels=1):
@@ -227,7 +295,7 @@ class Sound(Signal):
             for i in range(nchannels):
                 x[:, i] = ((x[:, i] - numpy.amin(x[:, i])) /
                            (numpy.amax(x[:, i]) - numpy.amin(x[:, i])) - 0.5) * 2
-        return Sound(x, samplerate)
+        return Sound(x, samplerate, copy=False)
 
     @staticmethod
     def powerlawnoise(duration=1.0, alpha=1, samplerate=None, nchannels=1, normalise=True):
@@ -244,9 +312,9 @@ class Sound(Signal):
         '''
         samplerate = Sound.get_samplerate(samplerate)
         duration = Sound.in_samples(duration, samplerate)
-        n = duration
+        n = duration  # the noise is computed at the exact length, so that its spectrum is exactly 1/f**alpha
         n2 = int(n/2)
-        f = numpy.array(numpy.fft.fftfreq(n, d=1.0/samplerate), dtype=complex)
+        f = numpy.array(slab.fft.fftfreq(n, d=1.0/samplerate), dtype=complex)
         f.shape = (len(f), 1)
         f = numpy.tile(f, (1, nchannels))
         if n % 2 == 1:
@@ -264,8 +332,7 @@ class Sound(Signal):
                               1.0 / (numpy.abs(f[n2])**(alpha/2.0)) *
                               numpy.random.randn(1, nchannels),
                               numpy.flipud(numpy.conj(a2))))
-        x = numpy.real(numpy.fft.ifft(d.flatten()))
-        x.shape = (n, nchannels)
+        x = numpy.real(slab.fft.ifft(d, axis=0))
         if normalise:
             for i in range(nchannels):
                 x[:, i] = ((x[:, i] - numpy.amin(x[:, i])) /
@@ -300,15 +367,17 @@ class Sound(Signal):
         '''
         samplerate = Sound.get_samplerate(samplerate)
         delay = 1/frequency
-        noise = Sound.whitenoise(duration, samplerate=samplerate)
+        nsamples = Sound.in_samples(duration, samplerate)
+        # the noise is computed at the exact length, so that the delay-and-add is circular
+        noise = Sound.whitenoise(nsamples, samplerate=samplerate)
         x = numpy.array(noise.data.T)[0]
-        irn_add = numpy.fft.fft(x)
+        irn_add = slab.fft.fft(x)
         n_samples, sample_dur = len(irn_add), float(1/samplerate)
-        w = 2 * numpy.pi*numpy.fft.fftfreq(n_samples, sample_dur)
+        w = 2 * numpy.pi*slab.fft.fftfreq(n_samples, sample_dur)
         d = float(delay)
         for k in range(1, niter+1):
             irn_add += (gain**k) * irn_add * numpy.exp(-1j * w * k * d)
-        irn_add = numpy.fft.ifft(irn_add)
+        irn_add = slab.fft.ifft(irn_add)
         x = numpy.real(irn_add)
         return Sound(x, samplerate)
 
@@ -317,7 +386,7 @@ class Sound(Signal):
         'Returns a click of the given duration (*100 microsec*).'
         samplerate = Sound.get_samplerate(samplerate)
         duration = Sound.in_samples(duration, samplerate)
-        return Sound(numpy.ones((duration, nchannels)), samplerate)
+        return Sound(numpy.ones((duration, nchannels)), samplerate, copy=False)
 
     @staticmethod
     def clicktrain(duration=1.0, frequency=500, clickduration=0.0001, samplerate=None):
@@ -329,8 +398,7 @@ class Sound(Signal):
         n = numpy.rint(duration/interval)
         oneclick = Sound.click(clickduration, samplerate=samplerate)
         oneclick.resize(interval)
-        oneclick.repeat(n)
-        return oneclick
+        return oneclick.repeat(n)
 
     @staticmethod
     def chirp(duration=1.0, from_frequency=100, to_frequency=None, samplerate=None, kind='quadratic'):
@@ -348,14 +416,14 @@ class Sound(Signal):
             to_frequency = samplerate / 2
         chirp = scipy.signal.chirp(
             t, from_frequency, t[-1], to_frequency, method=kind, vertex_zero=True)
-        return Sound(chirp, samplerate=samplerate)
+        return Sound(chirp, samplerate=samplerate, copy=False)
 
     @staticmethod
     def silence(duration=1.0, samplerate=None, nchannels=1):
         'Returns a silent sound (all samples equal zero) for the given duration.'
         samplerate = Sound.get_samplerate(samplerate)
         duration = Sound.in_samples(duration, samplerate)
-        return Sound(numpy.zeros((duration, nchannels)), samplerate)
+        return Sound(numpy.zeros((duration, nchannels)), samplerate, copy=False)
 
     @staticmethod
     def vowel(vowel='a', gender=None, glottal_pulse_time=12, formant_multiplier=1, duration=1., samplerate=None, nchannels=1):
@@ -403,7 +471,7 @@ class Sound(Signal):
                                                      f * numpy.mod(times, glottal_pulse_time))
         if nchannels > 1:
             out = numpy.tile(out, (nchannels, 1))
-        vowel = Sound(data=out, samplerate=samplerate)
+        vowel = Sound(data=out, samplerate=samplerate, copy=False)
         vowel.filter(frequency=0.75*samplerate/2, kind='lp')
         return vowel
 
@@ -428,7 +496,7 @@ class Sound(Signal):
                          phase=rand_phases, samplerate=samplerate)
         # collapse across channels
         data = numpy.sum(sig.data, axis=1) / len(freqs)
-        return Sound(data, samplerate=samplerate)
+        return Sound(data, samplerate=samplerate, copy=False)
 
     @staticmethod
     def erb_noise(duration=1.0, low_cutoff=125, high_cutoff=4000, samplerate=None):
@@ -449,13 +517,13 @@ class Sound(Signal):
         lev = -10*numpy.log10(24.7*(4.37*frq))
         filt = 10.**(lev/20)
         noise = numpy.random.randn(n)
-        noise = numpy.real(numpy.fft.ifft(numpy.concatenate(
-            (filt, filt[::-1])) * numpy.fft.fft(noise)))
+        noise = numpy.real(slab.fft.ifft(numpy.concatenate(
+            (filt, filt[::-1])) * slab.fft.fft(noise)))
         noise = noise/numpy.sqrt(numpy.mean(noise**2))
         band = numpy.zeros(len(lev))
         band[round(low_cutoff/df):round(high_cutoff/df)] = 1
-        fnoise = numpy.real(numpy.fft.ifft(numpy.concatenate(
-            (band, band[::-1])) * numpy.fft.fft(noise)))
+        fnoise = numpy.real(slab.fft.ifft(numpy.concatenate(
+            (band, band[::-1])) * slab.fft.fft(noise)))
         fnoise = fnoise[:duration]
         return Sound(data=fnoise, samplerate=samplerate)
 
@@ -468,12 +536,14 @@ class Sound(Signal):
                 raise ValueError('All sounds must have the same sample rate.')
         sounds = tuple(s.data for s in sounds)
         x = numpy.vstack(sounds)
-        return Sound(x, samplerate)
+        return Sound(x, samplerate, copy=False)
 
     # instance methods
-    def write(self, filename, normalise=True, fmt='WAV'):
+    def write(self, filename, normalise=True, fmt='WAV', subtype=None):
         '''
         Save the sound as a WAV. If `normalise` is set to True, the maximal amplitude of the sound is normalised to 1.
+        `subtype` sets the sample format (see :func:`soundfile.available_subtypes`), for instance 'FLOAT' to write
+        files that can be memory-mapped with :meth:`memmap`; the default is 16 bit PCM for WAV files.
         '''
         if not have_soundfile:
             raise ImportError(
@@ -484,9 +554,10 @@ class Sound(Signal):
             self = self.resample(int(self.samplerate))
             print('Sampling rate rounded to nearest integer for writing!')
         if normalise:
-            soundfile.write(filename, self.data / numpy.amax(numpy.abs(self.data)), self.samplerate, format=fmt)
+            soundfile.write(filename, self.data / numpy.amax(numpy.abs(self.data)), self.samplerate, format=fmt,
+                            subtype=subtype)
         else:
-            soundfile.write(filename, self.data, self.samplerate, format=fmt)
+            soundfile.write(filename, self.data, self.samplerate, format=fmt, subtype=subtype)
 
     def ramp(self, when='both', duration=0.01, envelope=None):
         """
@@ -500,16 +571,22 @@ class Sound(Signal):
         """
         sound = copy.deepcopy(self)
         when = when.lower().strip()
-        if envelope is None:
-            envelope = lambda t: numpy.sin(numpy.pi * t / 2) ** 2  # squared sine window
-        sz = Sound.in_samples(duration, sound.samplerate)
-        multiplier = envelope(numpy.reshape(numpy.linspace(0.0, 1.0, sz), (sz, 1)))
+        multiplier = Sound._ramp_multiplier(duration, sound.samplerate, envelope)
+        sz = len(multiplier)
         if when in ('onset', 'both'):
             sound.data[:sz, :] *= multiplier
         if when in ('offset', 'both'):
             sound.data[sound.nsamples-sz:, :] *= multiplier[::-1]
         return sound
 
+    @staticmethod
+    def _ramp_multiplier(duration, samplerate, envelope=None):
+        'Returns the onset ramp used by :meth:`ramp` as array with shape (nsamples, 1).'
+        if envelope is None:
+            envelope = lambda t: numpy.sin(numpy.pi * t / 2) ** 2  # squared sine window
+        sz = Sound.in_samples(duration, samplerate)
+        return envelope(numpy.reshape(numpy.linspace(0.0, 1.0, sz), (sz, 1)))
+
     def repeat(self, n):
         """
         Repeat the sound n times.
@@ -536,15 +613,10 @@ class Sound(Signal):
             raise ValueError('Cannot crossfade sounds with unequal numbers of channels.')
         if sound1.samplerate != sound2.samplerate:
             raise ValueError('Cannot crossfade sounds with unequal samplerates.')
-        overlap = Sound.in_samples(overlap, samplerate=sound1.samplerate)
-        n_total = sound1.nsamples + sound2.nsamples - overlap
-        silence = Sound.silence(sound1.nsamples - overlap,
-                                samplerate=sound1.samplerate, nchannels=sound1.nchannels)
-        sound1.ramp(duration=overlap, when='offset')
-        sound1.resize(n_total)  # extend sound1 to total length
-        sound2.ramp(duration=overlap, when='onset')
-        sound2 = Sound.sequence(silence, sound2)  # sound2 has to be prepended with silence
-        return sound1 + sound2
+        buffer = SoundBuffer(capacity=sound1.nsamples + sound2.nsamples, dtype=sound1.data.dtype)
+        buffer.append(sound1)
+        buffer.append(sound2, ramp=overlap, overlap=overlap)
+        return sound1._new_from_data(buffer.to_sound().data)  # keeps the class of sound1 (Binaural, for instance)
 
     def pulse(self, pulse_frequency=4, duty=0.75, rf_time=0.05):
         """
@@ -557,20 +629,23 @@ class Sound(Signal):
             slab.Sound: pulsed copy of the instance
         """
         sound = copy.deepcopy(self)
+        # if data is 2D (>1 channel) broadcase the envelope to fit
+        sound.data *= numpy.broadcast_to(sound._pulse_envelope(pulse_frequency, duty, rf_time), sound.data.shape)
+        return sound
+
+    def _pulse_envelope(self, pulse_frequency, duty, rf_time):
+        'Returns the envelope used by :meth:`pulse` as array with shape (nsamples, 1).'
         pulse_period = 1/pulse_frequency
-        n_pulses = round(sound.duration / pulse_period)  # number of pulses in the stimulus
-        pulse_period = sound.duration / n_pulses  # period in s, fits into stimulus duration
-        pulse_samples = Sound.in_samples(pulse_period * duty, sound.samplerate)
-        fall_samples = Sound.in_samples(rf_time, sound.samplerate)  # 5ms rise/fall time
+        n_pulses = round(self.duration / pulse_period)  # number of pulses in the stimulus
+        pulse_period = self.duration / n_pulses  # period in s, fits into stimulus duration
+        pulse_samples = Sound.in_samples(pulse_period * duty, self.samplerate)
+        fall_samples = Sound.in_samples(rf_time, self.samplerate)  # 5ms rise/fall time
         fall = numpy.cos(numpy.pi * numpy.arange(fall_samples) / (2 * (fall_samples)))**2
         pulse = numpy.concatenate((1-fall, numpy.ones(pulse_samples - 2 * fall_samples), fall))
         pulse = numpy.concatenate(
-            (pulse, numpy.zeros(Sound.in_samples(pulse_period, sound.samplerate)-len(pulse))))
+            (pulse, numpy.zeros(Sound.in_samples(pulse_period, self.samplerate)-len(pulse))))
         envelope = numpy.tile(pulse, n_pulses)
-        envelope = envelope[:, None]  # add an empty axis to get to the same shape as sound.data
-        # if data is 2D (>1 channel) broadcase the envelope to fit
-        sound.data *= numpy.broadcast_to(envelope, sound.data.shape)
-        return sound
+        return envelope[:, None]  # add an empty axis to get to the same shape as sound.data
 
     def am(self, frequency=10, depth=1, phase=0):
         """
@@ -583,12 +658,15 @@ class Sound(Signal):
             slab.Sound: amplitude modulated copy of the instance
         """
         sound = copy.deepcopy(self)
-        envelope = (1 + depth * numpy.sin(2 * numpy.pi * frequency * sound.times + phase))
-        envelope = envelope[:, None]
-        sound.data *= numpy.broadcast_to(envelope, sound.data.shape)
+        sound.data *= numpy.broadcast_to(sound._am_envelope(frequency, depth, phase), sound.data.shape)
         return sound
 
-    def filter(self, frequency=100, kind='hp'):
+    def _am_envelope(self, frequency, depth, phase):
+        'Returns the modulating function used by :meth:`am` as array with shape (nsamples, 1).'
+        envelope = (1 + depth * numpy.sin(2 * numpy.pi * frequency * self.times + phase))
+        return envelope[:, None]
+
+    def filter(self, frequency=100, kind='hp', iir=None, order=4):
         """
         Convenient wrapper for the Filter class for a standard low-, high-, bandpass,
         and bandstop filter.
@@ -597,6 +675,10 @@ class Sound(Signal):
                                     tuple eith lowe cutoff and upper cutoff for bandpass and -stop.
             kind (str): type of filter, can be "lp" (lowpass), "hp" (highpass)
                         "bp" (bandpass) or "bs" (bandstop)
+            iir (None, str): if None, a FIR filter with up to 1000 taps is used. Otherwise, the type of IIR
+                             filter ("butter", "cheby1", "cheby2", "ellip", or "bessel"), which is much faster for
+                             long sounds.
+            order (int): order of the IIR filter
         Returns:
             slab.Sound: filtered copy of the instance
 
@@ -604,10 +686,21 @@ class Sound(Signal):
         sound = copy.deepcopy(self)
         n = min(1000, self.nsamples)
         filt = Filter.band(
-            frequency=frequency, kind=kind, samplerate=self.samplerate, length=n)
+            frequency=frequency, kind=kind, samplerate=self.samplerate, length=n, iir=iir, order=order)
         sound.data = filt.apply(self).data
         return sound
 
+    def lazy(self):
+        '''
+        Returns a :class:`LazySound` that records ramps, modulations, envelopes, filters and level changes
+        of the sound and applies them in one pass when the samples are needed.
+
+        >>> sound = slab.Sound.pinknoise(duration=10.0).lazy().ramp().filter(frequency=500, kind='lp').am()
+        >>> sound.level = 70
+        >>> sound = sound.compute()  # returns a Sound
+        '''
+        return LazySound(self)
+
     def aweight(self):
         '''
         Returns A-weighted sound. A-weighting is applied to instrument-recorded sounds
@@ -766,19 +859,38 @@ class Sound(Signal):
         else:
             return freqs, times, power
 
-    def cochleagram(self, bandwidth=1/5, show=True, axis=None, **kwargs):
+    def cochleagram(self, bandwidth=1/5, show=True, axis=None, filterbank='cos', **kwargs):
         '''
         Computes a cochleagram of the sound by filtering with a bank of cosine-shaped filters with given bandwidth
         (*1/5* th octave) and applying a cube-root compression to the resulting envelopes.
+        If `filterbank` is 'gammatone', a bank of recursive gammatone filters with the same spacing is used instead
+        (see :meth:`Filter.gammatone_filterbank`), and the envelopes are computed by rectifying and smoothing the
+        subbands. This takes time and memory proportional to the duration of the sound and is much faster for long
+        sounds, but the filters are causal, so that the envelopes are slightly delayed, most of all in low bands. The
+        bands are filtered one after the other (:func:`scipy.signal.sosfilt` takes one set of sections per call), so
+        that only the envelopes, and not all subbands, are held in memory.
         If show is False, returns the envelopes.
         '''
-        fbank = Filter.cos_filterbank(bandwidth=bandwidth, low_cutoff=20,
-                                      high_cutoff=None, samplerate=self.samplerate)
-        freqs = fbank.filter_bank_center_freqs()
-        subbands = fbank.apply(self.channel(0))
-        envs = subbands.envelope()
-        envs.data[envs.data < 1e-9] = 0  # remove small values that cause waring with numpy.power
-        envs = envs.data ** (1/3)  # apply non-linearity (cube-root compression)
+        if filterbank == 'gammatone':
+            if not have_scipy:
+                raise ImportError('Computing gammatone cochleagrams requires Scipy.')
+            fbank = Filter.gammatone_filterbank(bandwidth=bandwidth, low_cutoff=20, samplerate=self.samplerate)
+            freqs = Filter._erb2freq(Filter._center_freqs(20, self.samplerate / 2, bandwidth)[0])
+            # smooth the rectified subbands with the cutoff of the Hilbert envelopes (the mean of a rectified sine
+            # is 2/pi of its amplitude), one band at a time, so that only the envelopes are kept in memory
+            lowpass = scipy.signal.butter(2, min(50, self.samplerate / 4), fs=self.samplerate, output='sos')
+            envs = numpy.empty((self.nsamples, fbank.nfilters))
+            for band, sos in enumerate(fbank.sos):
+                envs[:, band] = scipy.signal.sosfilt(lowpass, numpy.abs(scipy.signal.sosfilt(sos, self.data[:, 0])))
+            envs *= numpy.pi / 2
+        else:
+            fbank = Filter.cos_filterbank(bandwidth=bandwidth, low_cutoff=20,
+                                          high_cutoff=None, samplerate=self.samplerate)
+            freqs = fbank.filter_bank_center_freqs()
+            subbands = fbank.apply(self.channel(0))
+            envs = subbands.envelope().data
+        envs[envs < 1e-9] = 0  # remove small values that cause waring with numpy.power
+        envs **= 1/3  # apply non-linearity (cube-root compression)
         if show or (axis is not None):
             if not have_pyplot:
                 raise ImportError('Plotting cochleagrams requires matplotlib.')
@@ -808,10 +920,13 @@ class Sound(Signal):
                 If show=False, returns `Z, freqs`, where `Z` is a 1D array of powers
                 and `freqs` are the corresponding frequencies.
         '''
-        freqs = numpy.fft.rfftfreq(self.nsamples, d=1/self.samplerate)
-        sig_rfft = numpy.zeros((len(freqs), self.nchannels))
-        for chan in range(self.nchannels):
-            sig_rfft[:, chan] = numpy.abs(numpy.fft.rfft(self.data[:, chan], axis=0))
+        freqs = slab.fft.rfftfreq(self.nsamples, d=1/self.samplerate)
+        if isinstance(self.data, numpy.memmap):  # one channel at a time, so that only one channel is read into memory
+            sig_rfft = numpy.empty((len(freqs), self.nchannels), dtype=self.data.dtype)
+            for chan in range(self.nchannels):
+                sig_rfft[:, chan] = numpy.abs(slab.fft.rfft(self.data[:, chan]))
+        else:
+            sig_rfft = numpy.abs(slab.fft.rfft(self.data, axis=0)).astype(self.data.dtype, copy=False)
         # scale by the number of points so that the magnitude does not depend on the length of the signal
         pxx = sig_rfft/len(freqs)
         pxx = pxx**2  # square to get the power
@@ -974,7 +1089,6 @@ class Sound(Signal):
         >>> for w in windows:
         >>>		process(w) # process windowed frame here
         '''
-        frame = copy.deepcopy(self)
         if not have_scipy:
             raise ImportError('Need scipy for time window processing.')
         window_nsamp = Sound.in_samples(duration, self.samplerate) * 2
@@ -986,9 +1100,9 @@ class Sound(Signal):
             window_nsamp, window_sigma), (self.nchannels, 1)).T
         idx = 0
         while idx + window_nsamp/2 < self.nsamples: # loop through windows, yield each one
-            frame.data = self.data[idx:min(self.nsamples, idx + window_nsamp), :]
+            # multiplying the slice with the window makes the frame a copy; the sound itself is not modified
+            frame = self._new_from_data(self.data[idx:idx + window_nsamp, :] * window[:min(self.nsamples-idx, window_nsamp)])
             frame.resize(window_nsamp)  # in case the last window is too short
-            frame *= window
             yield frame
             idx += step_nsamp
 
@@ -1004,6 +1118,410 @@ class Sound(Signal):
         return numpy.array(samplepoints) / self.samplerate # convert to array of time points
 
 
+class SoundBuffer:
+    '''
+    Sound that grows by appending sounds at the end, for instance when assembling a stimulus from many parts or
+    concatenating the stimuli of a sequence of trials. The samples are kept in an array with free space at the end,
+    which doubles in size when it is full, so that appending n sounds copies each sample only a few times instead
+    of n times as with repeated :meth:`Sound.sequence`. Sounds can be joined with ramps and overlaps (crossfades).
+
+    Arguments:
+        samplerate: samplerate of the sounds (defaults to the samplerate of the first appended sound)
+        nchannels: number of channels (defaults to the number of channels of the first appended sound)
+        capacity: number of samples (in samples or seconds) for which space is reserved initially
+        dtype: sample type, 'float32' or 'float64' (see :meth:`Signal.set_default_dtype`)
+
+    >>> buffer = slab.SoundBuffer()
+    >>> for frequency in (500, 1000, 2000):
+    ...     buffer.append(slab.Sound.tone(frequency=frequency, duration=0.2), ramp=0.01)
+    >>> sound = buffer.to_sound()
+    '''
+    nsamples = property(fget=lambda self: self._nsamples, doc='The number of samples in the buffer.')
+    duration = property(fget=lambda self: self._nsamples / self.samplerate, doc='The length of the sound in seconds.')
+    capacity = property(fget=lambda self: len(self._data), doc='The number of samples that fit into the buffer.')
+    data = property(fget=lambda self: self._data[:self._nsamples], doc='The samples in the buffer (a view).')
+
+    def __init__(self, samplerate=None, nchannels=None, capacity=1024, dtype=None):
+        self.samplerate = samplerate
+        self.nchannels = nchannels
+        self._capacity = capacity
+        self._dtype = Sound.get_dtype(dtype)
+        self._data = None
+        self._nsamples = 0
+        self._shared = False  # True after to_sound, which returns a view of the samples
+
+    def __len__(self):
+        return self._nsamples
+
+    def __str__(self):
+        return f'{type(self)} duration {self.duration}, samples {self.nsamples}, channels {self.nchannels}, ' \
+               f'samplerate {self.samplerate}, capacity {self.capacity}'
+
+    def _reserve(self, nsamples):
+        'Makes space for `nsamples` samples, doubling the capacity, and copies the samples if they were handed out.'
+        if self._data is None:
+            capacity = max(Sound.in_samples(self._capacity, self.samplerate), nsamples)
+            self._data = numpy.zeros((capacity, self.nchannels), dtype=self._dtype)
+        elif nsamples > len(self._data) or self._shared:
+            capacity = max(2 * len(self._data), nsamples) if nsamples > len(self._data) else len(self._data)
+            data = numpy.zeros((capacity, self.nchannels), dtype=self._dtype)
+            data[:self._nsamples] = self._data[:self._nsamples]
+            self._data = data
+            self._shared = False
+
+    def append(self, sound, ramp=None, overlap=0):
+        '''
+        Appends `sound` (a Sound or array of samples) to the end of the buffer. If `ramp` is a duration (in samples or
+        seconds), the end of the buffer is ramped off and the start of the sound is ramped on (see :meth:`Sound.ramp`)
+        before they are joined. If `overlap` is a duration, the sound starts that much before the end of the buffer and
+        is added to the samples there; with ramp and overlap of the same duration, the sounds are crossfaded (see
+        :meth:`Sound.crossfade`).
+        '''
+        if isinstance(sound, Signal):
+            if self.samplerate is None:
+                self.samplerate = sound.samplerate
+            elif sound.samplerate != self.samplerate:
+                raise ValueError('All sounds must have the same sample rate.')
+            sound = sound.data
+        if self.samplerate is None:
+            self.samplerate = Sound.get_samplerate(None)
+        sound = numpy.asarray(sound)
+        if sound.ndim == 1:
+            sound = sound[:, numpy.newaxis]
+        if self.nchannels is None:
+            self.nchannels = sound.shape[1]
+        elif sound.shape[1] != self.nchannels:
+            raise ValueError('All sounds must have the same number of channels.')
+        overlap = min(Sound.in_samples(overlap, self.samplerate), self._nsamples)
+        start = self._nsamples - overlap
+        self._reserve(start + len(sound))
+        if ramp and self._nsamples:  # the first sound has no junction
+            multiplier = Sound._ramp_multiplier(ramp, self.samplerate)
+            sz = len(multiplier)
+            if sz > min(self._nsamples, len(sound)):
+                raise ValueError('The ramp is longer than the buffer or the appended sound.')
+            self._data[self._nsamples-sz:self._nsamples] *= multiplier[::-1]  # offset ramp at the end of the buffer
+            sound = numpy.array(sound[:sz] * multiplier, dtype=self._dtype), sound[sz:]  # onset ramp of the sound
+        else:
+            sound = (sound,)
+        for part in sound:  # add the overlapping part and copy the rest
+            end = start + len(part)
+            added = max(min(end, self._nsamples) - start, 0)
+            self._data[start:start + added] += part[:added]
+            self._data[start + added:end] = part[added:]
+            start = end
+        self._nsamples = max(self._nsamples, start)
+
+    def extend(self, sounds, ramp=None, overlap=0):
+        'Appends each sound in `sounds` (see :meth:`append`).'
+        for sound in sounds:
+            self.append(sound, ramp=ramp, overlap=overlap)
+
+    def to_sound(self):
+        '''
+        Returns the samples in the buffer as Sound. The data of the sound is a view of the buffer, so that no samples
+        are copied. If more sounds are appended afterwards, the buffer first copies its samples, so that
+        the returned sound does not change.
+        '''
+        if self._data is None:
+            raise ValueError('Cannot make a sound from an empty buffer.')
+        self._shared = True
+        return Sound(self.data, samplerate=self.samplerate, dtype=self._dtype, copy=False)
+
+
+class SoundBatch(SignalBatch):
+    '''
+    Stack of sounds with the same number of samples and channels and the same samplerate, for instance a list of
+    precomputed stimuli. The level, ramps, filters, envelopes and spectra are computed for all sounds at once.
+    See :class:`SignalBatch` for the arguments.
+
+    >>> batch = slab.SoundBatch([slab.Sound.pinknoise() for _ in range(100)])
+    >>> batch.level = 70
+    >>> batch = batch.ramp()
+    >>> stims = slab.Precomputed(batch.to_list())
+    '''
+    _item_type = Sound
+
+    def _get_level(self):
+        '''
+        Returns the level of each sound in dB SPL (RMS) assuming arrays are in Pascals, as array with one value per
+        sound, or with shape `(nitems, nchannels)` for multi-channel sounds.
+        '''
+        rms_value = numpy.std(self.data, axis=1, dtype=float)
+        with numpy.errstate(divide='ignore'):
+            rms_dB = numpy.where(rms_value == 0, 0, 20.0*numpy.log10(rms_value/2e-5))
+        if self.nchannels == 1:
+            return rms_dB[:, 0] + _calibration_intensity
+        return rms_dB + _calibration_intensity
+
+    def _set_level(self, level):
+        '''
+        Sets the level of the sounds in dB SPL (RMS) assuming arrays are in Pascals. `level` can be a single value
+        for all sounds and channels, one value per sound, or an array with shape `(nitems, nchannels)`.
+        '''
+        rms_dB = self._get_level().reshape(self.nitems, self.nchannels)
+        level = numpy.asarray(level, dtype=float)
+        if level.ndim == 1:
+            level = level[:, numpy.newaxis]  # one level per sound
+        gain = 10**((level-rms_dB)/20.)
+        self.data *= gain[:, numpy.newaxis, :].astype(self.data.dtype)
+
+    level = property(fget=_get_level, fset=_set_level, doc='''
+    Can be used to get or set the rms levels of the sounds in dB. The levels can be set to one value for all sounds,
+    a list of values with one value per sound, or an array with shape `(nitems, nchannels)`.
+    ''')
+
+    def ramp(self, when='both', duration=0.01, envelope=None):
+        '''
+        Returns a copy of the batch with on and/or off ramps added to all sounds (see :meth:`Sound.ramp`).
+        '''
+        when = when.lower().strip()
+        multiplier = Sound._ramp_multiplier(duration, self.samplerate, envelope).astype(self.data.dtype)
+        sz = len(multiplier)
+        batch = self._new_from_data(self.data.copy())
+        if when in ('onset', 'both'):
+            batch.data[:, :sz, :] *= multiplier
+        if when in ('offset', 'both'):
+            batch.data[:, self.nsamples-sz:, :] *= multiplier[::-1]
+        return batch
+
+    def filter(self, frequency=100, kind='hp', iir=None, order=4):
+        '''
+        Returns a copy of the batch with all sounds filtered by a low-, high-, bandpass, or bandstop filter
+        (see :meth:`Sound.filter`).
+        '''
+        n = min(1000, self.nsamples)
+        filt = Filter.band(frequency=frequency, kind=kind, samplerate=self.samplerate, length=n, iir=iir, order=order)
+        return filt.apply(self)
+
+    def spectrum(self, low_cutoff=16, high_cutoff=None, log_power=True):
+        '''
+        Returns the spectra of all sounds as `Z, freqs`, where `Z` is an array of powers with shape
+        `(nitems, nfrequencies, nchannels)` and `freqs` are the corresponding frequencies, computed like in
+        :meth:`Sound.spectrum` but without plotting.
+        '''
+        freqs = slab.fft.rfftfreq(self.nsamples, d=1/self.samplerate)
+        pxx = numpy.abs(slab.fft.rfft(self.data, axis=1)).astype(self.data.dtype)
+        # scale by the number of points so that the magnitude does not depend on the length of the signal
+        pxx = (pxx/len(freqs))**2  # square to get the power
+        if low_cutoff is not None or high_cutoff is not None:
+            if low_cutoff is None:
+                low_cutoff = 0
+            if high_cutoff is None:
+                high_cutoff = numpy.amax(freqs)
+            I = numpy.logical_and(low_cutoff <= freqs, freqs <= high_cutoff)
+            pxx = pxx[:, I, :]
+            freqs = freqs[I]
+        if log_power:
+            pxx[pxx < 1e-20] = 1e-20  # no zeros because we take logs
+            pxx = 10 * numpy.log10(pxx)
+        return pxx, freqs
+
+
+class LazySound:
+    '''
+    Records operations on a sound and applies them when the samples are needed (see :meth:`Sound.lazy`). The
+    methods :meth:`ramp`, :meth:`pulse`, :meth:`am`, :meth:`envelope`, and multiplication with a number or array
+    are gains that are multiplied into one gain per sample. Consecutive filters (:meth:`filter`,
+    :meth:`apply_filter`) are multiplied into one frequency response, which is applied with a single forward and
+    inverse Fourier transform. Setting the level is deferred until the level of the preceding operations is known.
+    Each method returns a new LazySound that shares the source sound, so that intermediate chains can be reused.
+    All other attributes, for instance :meth:`Sound.play`, are taken from the computed sound.
+
+    Filters are applied as spectral products, which corresponds to circular convolution: like :meth:`Sound.filter`,
+    FIR filters are applied without phase shift (with their squared magnitude response), but the samples near the
+    beginning and end of the sound can differ from those of :meth:`Filter.apply`.
+
+    Arguments:
+        sound: the Sound (or subclass) to which the operations are applied. Its samples are not changed.
+    '''
+
+    def __init__(self, sound, operations=()):
+        self._source = sound
+        self._operations = tuple(operations)
+        self._result = None
+
+    def __repr__(self):
+        return f'{type(self)} ({repr(self._source)}, {[kind for kind, _ in self._operations]})'
+
+    def __str__(self):
+        return f'{type(self)} of {self._source}, operations {[kind for kind, _ in self._operations]}'
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.compute(), name)
+
+    def _then(self, kind, value):
+        'Returns a new LazySound with the operation `kind` (\'gain\', \'response\', or \'level\') appended.'
+        return LazySound(self._source, self._operations + ((kind, value),))
+
+    def __mul__(self, other):
+        return self._then('gain', numpy.asarray(getattr(other, 'data', other)))
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self._then('gain', 1 / numpy.asarray(getattr(other, 'data', other)))
+
+    def __neg__(self):
+        return self._then('gain', -1)
+
+    def ramp(self, when='both', duration=0.01, envelope=None):
+        'Records an on and/or off ramp (see :meth:`Sound.ramp`).'
+        when = when.lower().strip()
+        multiplier = Sound._ramp_multiplier(duration, self._source.samplerate, envelope)
+        sz = len(multiplier)
+        gain = numpy.ones((self._source.nsamples, 1))
+        if when in ('onset', 'both'):
+            gain[:sz] *= multiplier
+        if when in ('offset', 'both'):
+            gain[self._source.nsamples-sz:] *= multiplier[::-1]
+        return self._then('gain', gain)
+
+    def pulse(self, pulse_frequency=4, duty=0.75, rf_time=0.05):
+        'Records a pulse envelope (see :meth:`Sound.pulse`).'
+        return self._then('gain', self._source._pulse_envelope(pulse_frequency, duty, rf_time))
+
+    def am(self, frequency=10, depth=1, phase=0):
+        'Records an amplitude modulation (see :meth:`Sound.am`).'
+        return self._then('gain', self._source._am_envelope(frequency, depth, phase))
+
+    def envelope(self, envelope, times=None, kind='gain'):
+        'Records multiplication with an envelope (see :meth:`Signal.envelope`).'
+        gains = _envelope_gains(envelope, times, kind, self._source.duration, self._source.times)
+        return self._then('gain', gains[:, numpy.newaxis])
+
+    def filter(self, frequency=100, kind='hp', iir=None, order=4):
+        'Records a low-, high-, bandpass, or bandstop filter (see :meth:`Sound.filter`).'
+        n = min(1000, self._source.nsamples)
+        return self.apply_filter(Filter.band(frequency=frequency, kind=kind, samplerate=self._source.samplerate,
+                                             length=n, iir=iir, order=order))
+
+    def apply_filter(self, filt):
+        '''
+        Records the application of the Filter `filt`, which must have one filter, or one filter per channel
+        of the sound.
+        '''
+        nsamples, samplerate = self._source.nsamples, self._source.samplerate
+        if (filt.samplerate != samplerate) and (filt.samplerate != 1):
+            raise ValueError('Filter and signal have different sampling rates.')
+        if filt.nfilters not in (1, self._source.nchannels):
+            raise ValueError('Number of filters must equal number of signal channels, or one.')
+        if filt.iir:  # sosfiltfilt applies the filter twice, forward and backward, which cancels the phase
+            freqs = slab.fft.rfftfreq(nsamples, d=1/samplerate)
+            response = numpy.stack([numpy.abs(scipy.signal.sosfreqz(sos, worN=freqs, fs=samplerate)[1])**2
+                                    for sos in filt.sos], axis=1)
+        elif filt.fir:  # filtfilt applies the filter twice, forward and backward, which cancels the phase
+            taps = filt.data
+            if len(taps) > nsamples:  # fold longer filters, so that the spectrum samples the response of all taps
+                taps = numpy.concatenate((taps, numpy.zeros((-len(taps) % nsamples, filt.nfilters), taps.dtype)))
+                taps = taps.reshape(-1, nsamples, filt.nfilters).sum(axis=0)
+            response = numpy.abs(slab.fft.rfft(taps, n=nsamples, axis=0))**2
+        else:  # interpolate the FFT filter bins to match the length of the fft of the signal
+            response = filt._interpolated_gains(nsamples, samplerate)
+        return self._then('response', response)
+
+    def _get_level(self):
+        'Returns the level of the computed sound (see :attr:`Sound.level`).'
+        return self.compute().level
+
+    def _set_level(self, level):
+        'Records setting the level, which is applied when the sound is computed (see :attr:`Sound.level`).'
+        self._operations = self._operations + (('level', level),)
+        self._result = None
+
+    level = property(fget=_get_level, fset=_set_level, doc='''
+    Setting the level is recorded like the other operations. Getting the level computes the sound.
+    ''')
+
+    def compute(self):
+        '''
+        Applies the recorded operations and returns the result as new object of the class of the source sound.
+        The result is kept until the next operation is recorded.
+        '''
+        if self._result is None:
+            self._result = self._source._new_from_data(self._evaluate())
+        return self._result
+
+    data = property(fget=lambda self: self.compute().data, doc='The samples of the computed sound.')
+
+    def _evaluate(self):
+        '''
+        Runs the operations, folding consecutive gains into one gain and consecutive filters into one response.
+        Gains that precede a filter are multiplied with the samples before the Fourier transform.
+        '''
+        samples, owned = self._source.data, False  # samples are copied when they are first changed
+        gain, response = 1, None
+
+        def flush(samples, owned, gain, response):
+            if response is not None:
+                spectrum = slab.fft.rfft(samples * gain if numpy.ndim(gain) or gain != 1 else samples, axis=0)
+                return slab.fft.irfft(spectrum * response, len(samples), axis=0), True
+            if numpy.ndim(gain) or gain != 1:
+                if owned:
+                    samples *= gain
+                    return samples, True
+                return samples * gain, True
+            return samples, owned
+
+        for kind, value in self._operations:
+            if kind == 'gain':
+                if response is not None:
+                    samples, owned = flush(samples, owned, gain, response)
+                    gain, response = 1, None
+                gain = gain * value
+            elif kind == 'response':
+                response = value if response is None else response * value
+            else:  # set the level of the samples computed so far
+                samples, owned = flush(samples, owned, gain, response)
+                response = None
+                rms_value = numpy.std(samples, axis=0, dtype=float)
+                with numpy.errstate(divide='ignore'):
+                    rms_dB = numpy.where(rms_value == 0, 0, 20.0*numpy.log10(rms_value/2e-5))
+                gain = 10**((numpy.asarray(value, dtype=float) - rms_dB - _calibration_intensity)/20.)
+        samples, owned = flush(samples, owned, gain, response)
+        if not owned:
+            samples = samples.copy()
+        return samples.astype(self._source.data.dtype, copy=False)
+
+
+def _wav_layout(filename):
+    '''
+    Returns sample type, number of channels, samplerate, byte offset and number of frames of the samples in a WAV
+    (or RF64) file with floating point samples.
+    '''
+    with open(filename, 'rb') as file:
+        riff, _, wave = struct.unpack('<4sI4s', file.read(12))
+        if riff not in (b'RIFF', b'RF64') or wave != b'WAVE':
+            raise ValueError(f'{filename} is not a WAV file.')
+        fmt, data_size = None, None
+        while True:
+            header = file.read(8)
+            if len(header) < 8:
+                raise ValueError(f'No data chunk found in {filename}.')
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id == b'data':
+                offset = file.tell()
+                break
+            chunk = file.read(size + size % 2)  # chunks are padded to even sizes
+            if chunk_id == b'fmt ':
+                fmt = chunk
+            elif chunk_id == b'ds64':  # RF64 files store the 64 bit size of the data chunk here
+                data_size = struct.unpack('<Q', chunk[8:16])[0]
+    if fmt is None:
+        raise ValueError(f'No format chunk found in {filename}.')
+    format_tag, nchannels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE, the actual format is in the sub-format GUID
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+    if format_tag != 3 or bits not in (32, 64):  # 3 is WAVE_FORMAT_IEEE_FLOAT
+        raise ValueError(f'Cannot memory-map {filename}, only WAV files with float samples are supported.')
+    if size != 0xFFFFFFFF:
+        data_size = size
+    available = pathlib.Path(filename).stat().st_size - offset
+    nframes = min(data_size or available, available) // block_align
+    return numpy.dtype(f'<f{bits // 8}'), nchannels, samplerate, offset, nframes
+
+
 def calibrate(intensity=None, make_permanent=False):
     '''
     Calibrate the presentation intensity of a setup. Enter the calibration intensity, if you know it.
@@ -0,0 +1,265 @@
+'''
+Class for processing sounds block by block (recordings that do not fit into memory, or real-time output).
+'''
+
+import copy
+import pathlib
+import numpy
+
+try:
+    import soundfile
+    have_soundfile = True
+except ImportError:
+    have_soundfile = False
+
+import slab.sound
+from slab.signal import Signal, Resampler, EnvelopeFollower, have_scipy
+from slab.sound import Sound, _blockwise_rms, _block_nsamples
+from slab.filter import Filter, StreamingFilter
+
+__all__ = ['StreamSignal']
+
+
+class StreamSignal:
+    '''
+    A signal that is processed in blocks of `blocksize` samples. Iterating over a StreamSignal yields the blocks as
+    arrays with shape (blocksize, nchannels) (the last block can be shorter). Methods with the names of the
+    corresponding :class:`Sound` methods return new StreamSignals that process the blocks when they are iterated
+    over, so that the memory needed does not depend on the length of the signal. Streams are usually made with
+    :meth:`read`, :meth:`from_sound`, or from a function that returns an iterator over blocks (for instance from a
+    soundcard).
+
+    Methods that need the whole signal, like getting and setting the :attr:`level`, read the stream once before
+    processing it. This works for streams made from files and sounds, and from functions that return a new iterator
+    on each call, but not for streams made from a single iterator, which can only be read once.
+    Causal filters delay the signal. The accumulated delay in seconds is kept in the attribute :attr:`latency`.
+
+    Arguments:
+        blocks: an iterable of blocks, or a function without arguments that returns one. Blocks are arrays or Signals
+            with shape (nsamples, nchannels).
+        samplerate: samplerate of the signal.
+        nchannels: number of channels of the signal.
+        nsamples: total number of samples, if known. Needed for offset ramps.
+        blocksize: number of samples in each block.
+
+    >>> stream = slab.StreamSignal.read('recording.wav')
+    >>> stream.level = 70
+    >>> stream.filter(frequency=500, kind='hp').ramp().write('processed.wav')
+    '''
+
+    def __init__(self, blocks, samplerate=None, nchannels=1, nsamples=None, blocksize=_block_nsamples):
+        self._blocks = blocks
+        self.samplerate = Signal.get_samplerate(samplerate)
+        self.nchannels = nchannels
+        self.nsamples = nsamples
+        self.blocksize = blocksize
+        self.latency = 0
+
+    def __str__(self):
+        return f'{type(self)} samples {self.nsamples}, channels {self.nchannels}, samplerate {self.samplerate}, ' \
+               f'blocksize {self.blocksize}'
+
+    def __iter__(self):
+        blocks = self._blocks() if callable(self._blocks) else self._blocks
+        # collect the samples of the incoming blocks into blocks of blocksize samples
+        pending, npending = [], 0
+        for block in blocks:
+            block = numpy.asarray(getattr(block, 'data', block)).reshape(-1, self.nchannels)
+            pending.append(block)
+            npending += len(block)
+            if npending >= self.blocksize:
+                samples = numpy.concatenate(pending) if len(pending) > 1 else pending[0]
+                nblocks = npending // self.blocksize
+                for i in range(nblocks):
+                    yield samples[i * self.blocksize:(i + 1) * self.blocksize]
+                pending = [samples[nblocks * self.blocksize:]]
+                npending = len(pending[0])
+        if npending:
+            yield numpy.concatenate(pending)
+
+    def _then(self, process, samplerate=None, nchannels=None, nsamples=None, latency=0):
+        '''
+        Returns a new StreamSignal that passes the blocks through the generator function `process`,
+        which takes and returns an iterator over blocks.
+        '''
+        new = StreamSignal(lambda: process(iter(self)), samplerate=samplerate or self.samplerate,
+                           nchannels=nchannels or self.nchannels, nsamples=nsamples or self.nsamples,
+                           blocksize=self.blocksize)
+        new.latency = self.latency + latency
+        return new
+
+    @staticmethod
+    def from_sound(sound, blocksize=_block_nsamples):
+        'Returns a StreamSignal of the blocks of the Sound `sound`. The blocks are views of the sound data.'
+        def blocks():
+            return (sound.data[start:start+blocksize] for start in range(0, sound.nsamples, blocksize))
+        return StreamSignal(blocks, samplerate=sound.samplerate, nchannels=sound.nchannels, nsamples=sound.nsamples,
+                            blocksize=blocksize)
+
+    @staticmethod
+    def read(filename, blocksize=_block_nsamples, dtype=None):
+        '''
+        Returns a StreamSignal that reads the file `filename` (any format supported by SoundFile) in blocks of
+        `blocksize` samples of type `dtype` (see :meth:`Signal.set_default_dtype`).
+        '''
+        if not have_soundfile:
+            raise ImportError(
+                'Reading wav files requires SoundFile (pip install git+https://github.com/bastibe/SoundFile.git')
+        filename = str(filename)
+        info = soundfile.info(filename)
+        dtype = Signal.get_dtype(dtype)
+
+        def blocks():
+            with soundfile.SoundFile(filename) as file:
+                yield from file.blocks(blocksize, dtype=dtype.name, always_2d=True)
+        return StreamSignal(blocks, samplerate=info.samplerate, nchannels=info.channels, nsamples=info.frames,
+                            blocksize=blocksize)
+
+    def to_sound(self):
+        'Reads all blocks and returns them as one Sound.'
+        blocks = list(self)
+        data = numpy.concatenate(blocks) if blocks else numpy.zeros((0, self.nchannels))
+        return Sound(data, samplerate=self.samplerate, dtype=data.dtype, copy=False)
+
+    def write(self, filename, normalise=False, fmt='WAV', subtype=None):
+        '''
+        Writes the blocks to a sound file. If `normalise` is True, the stream is read twice, first to find the maximal
+        amplitude, and then to write the samples divided by it. See :meth:`Sound.write` for the other arguments.
+        Unlike :meth:`Sound.write`, `normalise` defaults to False: normalising needs the whole stream before the first
+        block is written, which doubles the processing and fails for streams that can only be read once (like
+        recordings from a soundcard). Pass ``normalise=True`` to write the same file as :meth:`Sound.write`.
+        '''
+        if not have_soundfile:
+            raise ImportError(
+                'Writing wav files requires SoundFile (pip install SoundFile).')
+        if isinstance(filename, pathlib.Path):
+            filename = str(filename)
+        scale = 1
+        if normalise:
+            scale = 1 / max(numpy.amax(numpy.abs(block)) for block in self)
+        with soundfile.SoundFile(filename, mode='w', samplerate=int(self.samplerate), channels=self.nchannels,
+                                 format=fmt, subtype=subtype) as file:
+            for block in self:
+                file.write(block * scale)
+
+    def __mul__(self, gain):
+        'Returns a stream with all samples multiplied by `gain` (a number or one number per channel).'
+        def process(blocks):
+            for block in blocks:
+                yield block * gain
+        return self._then(process)
+    __rmul__ = __mul__
+
+    def _get_level(self):
+        'Returns the level in dB SPL (RMS) like :attr:`Sound.level`, reading the whole stream once.'
+        rms_value = _blockwise_rms(iter(self), self.nchannels)
+        with numpy.errstate(divide='ignore'):
+            rms_dB = numpy.where(rms_value == 0, 0, 20.0*numpy.log10(rms_value/2e-5))
+        if self.nchannels == 1:
+            return rms_dB[0] + slab.sound._calibration_intensity
+        return rms_dB + slab.sound._calibration_intensity
+
+    def _set_level(self, level):
+        'Sets the level by measuring the level of the stream and scaling the blocks when they are read.'
+        gain = 10**((numpy.asarray(level, dtype=float) - self._get_level())/20.)
+        scaled = copy.copy(self) * gain  # the copy reads the blocks of the original stream
+        self._blocks = scaled._blocks
+
+    level = property(fget=_get_level, fset=_set_level, doc='''
+    Can be used to get or set the rms level of the stream in dB, like :attr:`Sound.level`. Both read the stream once.
+    ''')
+
+    def ramp(self, when='both', duration=0.01, envelope=None):
+        'Returns a stream with on and/or off ramps (see :meth:`Sound.ramp`). Offset ramps require `nsamples`.'
+        when = when.lower().strip()
+        multiplier = Sound._ramp_multiplier(duration, self.samplerate, envelope)
+        sz = len(multiplier)
+        onset = multiplier if when in ('onset', 'both') else multiplier[:0]
+        if when in ('offset', 'both'):
+            if self.nsamples is None:
+                raise ValueError('Offset ramps require the number of samples of the stream.')
+            offset_start = self.nsamples - sz
+        else:
+            offset_start = numpy.inf
+
+        def process(blocks):
+            start = 0
+            for block in blocks:
+                block = numpy.array(block)  # the ramps change the block, which may be a view of a sound
+                end = start + len(block)
+                if start < len(onset):
+                    block[:len(onset) - start] *= onset[start:end]
+                if end > offset_start:
+                    first = max(offset_start - start, 0)
+                    block[first:] *= multiplier[::-1][start + first - offset_start:end - offset_start]
+                start = end
+                yield block
+        return self._then(process)
+
+    def filter(self, frequency=100, kind='hp', iir=None, order=4):
+        '''
+        Returns a stream filtered with a low-, high-, bandpass, or bandstop filter (see :meth:`Sound.filter`).
+        See :meth:`apply_filter` for how the filter is applied.
+        '''
+        n = min(1000, self.nsamples or 1000)
+        return self.apply_filter(Filter.band(frequency=frequency, kind=kind, samplerate=self.samplerate, length=n,
+                                             iir=iir, order=order))
+
+    def apply_filter(self, filt):
+        '''
+        Returns a stream filtered with the Filter `filt`, with the channels of stream and filter combined like in
+        :meth:`Filter.apply`. The filter is applied causally with a :class:`StreamingFilter`. FIR filters are applied
+        twice, which gives the magnitude response of :meth:`Filter.apply` (a forward and backward pass), and delay the
+        stream by ntaps-1 samples. FFT filters are converted to linear-phase FIR filters and delay the stream by
+        nfrequencies-1 samples. IIR filters are also applied twice, both times forward, and do not have a constant
+        delay (:attr:`latency` is not changed). The output has as many samples as the input.
+        '''
+        if not have_scipy:
+            raise ImportError('Streaming filters requires scipy.signal.')
+        if (filt.samplerate != self.samplerate) and (filt.samplerate != 1):
+            raise ValueError('Filter and signal have different sampling rates.')
+        if filt.nfilters not in (1, self.nchannels) and self.nchannels != 1:
+            raise ValueError(
+                'Number of filters must equal number of signal channels, or either one of them must be equal to 1.')
+        if filt.iir:
+            filt = Filter(numpy.concatenate((filt.sos, filt.sos), axis=1), samplerate=filt.samplerate, iir=True)
+        elif filt.fir:
+            taps = numpy.stack([numpy.convolve(filt.data[:, i], filt.data[:, i]) for i in range(filt.nfilters)],
+                               axis=1)
+            filt = Filter(taps, samplerate=filt.samplerate, fir=True, copy=False)
+        delay = 0 if filt.iir else (filt.ntaps - 1) / 2 if filt.fir else filt.nfrequencies - 1  # in samples
+
+        def process(blocks):
+            streaming = StreamingFilter(filt, nchannels=self.nchannels, blocksize=self.blocksize)
+            for block in blocks:
+                yield streaming.process(block)
+        return self._then(process, nchannels=max(self.nchannels, filt.nfilters),
+                          latency=delay / self.samplerate)
+
+    def resample(self, samplerate):
+        'Returns a stream resampled to `samplerate` with a :class:`Resampler`.'
+        nsamples = None if self.nsamples is None else \
+            Sound.in_samples(float(self.nsamples / self.samplerate), samplerate)
+
+        def process(blocks):
+            resampler = Resampler(self.samplerate, samplerate, nchannels=self.nchannels)
+            for block in blocks:
+                yield resampler.process(block)
+            yield resampler.flush()
+
+        def trimmed(blocks):  # Signal.resample has rint(duration * samplerate) samples, the resampler ceil(...)
+            remaining = numpy.inf if nsamples is None else nsamples
+            for block in process(blocks):
+                block = block[:max(remaining, 0)] if remaining < len(block) else block
+                remaining -= len(block)
+                yield block
+        return self._then(trimmed, samplerate=samplerate, nsamples=nsamples)
+
+    def envelope(self, kind='gain'):
+        'Returns a stream of the Hilbert envelope, computed with an :class:`EnvelopeFollower`.'
+        def process(blocks):
+            follower = EnvelopeFollower(self.samplerate, nchannels=self.nchannels, kind=kind)
+            for block in blocks:
+                yield follower.process(block)
+        latency = EnvelopeFollower(self.samplerate, nchannels=self.nchannels).latency
+        return self._then(process, latency=latency)
@@ -1,6 +1,12 @@
 import slab
 import numpy
+import pytest
 import scipy
+import scipy.signal
+import tempfile
+from pathlib import Path
+DIR = tempfile.TemporaryDirectory()
+PATH = Path(DIR.name)
 
 
 def test_band():
@@ -13,6 +19,197 @@ def test_band():
     sound = bandpass.apply(sound)
 
 
+def test_iir():
+    sound = slab.Sound.whitenoise(duration=0.5, nchannels=2)
+    lowpass = slab.Filter.band(frequency=1000, kind='lp', iir='butter', order=6, samplerate=sound.samplerate)
+    sos = scipy.signal.butter(6, 1000, fs=sound.samplerate, output='sos')
+    numpy.testing.assert_allclose(lowpass.sos[0], sos)
+    numpy.testing.assert_allclose(lowpass.apply(sound).data, scipy.signal.sosfiltfilt(sos, sound.data, axis=0))
+    numpy.testing.assert_allclose(lowpass.apply(sound, zero_phase=False).data,
+                                  scipy.signal.sosfilt(sos, sound.data, axis=0))
+    numpy.testing.assert_allclose(sound.filter(frequency=1000, kind='lp', iir='butter', order=6).data,
+                                  lowpass.apply(sound).data)
+    sections = [scipy.signal.ellip(4, 1, 60, band, btype='bandpass', fs=sound.samplerate, output='sos')
+                for band in ((500, 700), (1000, 1400))]
+    bank = slab.Filter(numpy.stack(sections), samplerate=sound.samplerate, iir=True)
+    expected = numpy.stack([scipy.signal.sosfiltfilt(sos, sound.data[:, 0]) for sos in sections], axis=1)
+    numpy.testing.assert_allclose(bank.apply(sound.channel(0)).data, expected)
+    w, h = lowpass.tf(show=False)
+    assert h[numpy.argmin(numpy.abs(w - 1000)), 0] == pytest.approx(-3, abs=0.1)
+    lowpass.save(PATH / 'iir_filter.flt')
+    loaded = slab.Filter.load(PATH / 'iir_filter.flt')
+    assert loaded.iir and not loaded.fir
+    numpy.testing.assert_array_equal(loaded.sos, lowpass.sos)
+    with pytest.raises(ValueError):
+        lowpass.ntaps
+
+
+def test_tf():
+    taps = numpy.random.randn(256, 3)
+    filt = slab.Filter(taps, samplerate=44100)
+    for nbins in (12, 256, 1000):  # fewer and more frequencies than taps
+        w, h = filt.tf(nbins=nbins, show=False)
+        assert h.shape == (nbins, 3)
+        for i in range(3):
+            expected_w, expected_h = scipy.signal.freqz(taps[:, i], worN=nbins, fs=44100)
+            numpy.testing.assert_allclose(w, expected_w)
+            numpy.testing.assert_allclose(h[:, i], 20 * numpy.log10(numpy.abs(expected_h)), atol=1e-9)
+    slab.Filter.clear_gain_cache()
+    _, h = filt.tf(channels=1, nbins=12, show=False)
+    assert h.shape == (12, 1) and slab.Filter.gain_cache_info()['hits'] == 0
+    filt.tf(channels=[0, 2], nbins=12, show=False)
+    assert slab.Filter.gain_cache_info()['hits'] == 1
+
+
+def test_fir_apply():
+    sound = slab.Sound.whitenoise(duration=1.0, nchannels=2)
+    for ntaps in (31, 1000):  # direct and FFT convolution
+        lowpass = slab.Filter.band(frequency=1000, kind='lp', length=ntaps)
+        expected = scipy.signal.filtfilt(lowpass.data[:, 0], [1], sound.data, axis=0)
+        numpy.testing.assert_allclose(lowpass.apply(sound).data, expected, atol=1e-12)
+        single = lowpass.apply(sound, zero_phase=False)
+        delay = (ntaps - 1) // 2
+        expected = scipy.signal.lfilter(lowpass.data[:, 0], [1], sound.data, axis=0)[delay:]
+        numpy.testing.assert_allclose(single.data[:sound.nsamples - delay], expected, atol=1e-12)
+    short = slab.Sound.whitenoise(duration=500)  # shorter than the padding of filtfilt
+    assert lowpass.apply(short).nsamples == 500
+
+
+def test_filterbank_apply():
+    sound = slab.Sound.whitenoise(duration=1.0)
+    fbank = slab.Filter.cos_filterbank(length=1000, bandwidth=1/5)
+    freqs = numpy.fft.rfftfreq(sound.nsamples, d=1/sound.samplerate)
+    spectrum = numpy.fft.rfft(sound.data[:, 0])
+    expected = numpy.stack([numpy.fft.irfft(spectrum * numpy.interp(freqs, fbank.frequencies, fbank.data[:, i]),
+                                            sound.nsamples) for i in range(fbank.nfilters)], axis=1)
+    numpy.testing.assert_allclose(fbank.apply(sound).data, expected, atol=1e-12)
+    single = fbank.apply(sound, dtype='float32')
+    assert single.data.dtype == numpy.float32
+    numpy.testing.assert_allclose(single.data, expected, atol=1e-5)
+    out = numpy.empty_like(expected)
+    assert fbank.apply(sound, out=out).data is out
+    taps = numpy.stack([scipy.signal.firwin(101, [f, 1.2 * f], pass_zero=False, fs=sound.samplerate)
+                        for f in (250, 500, 1000)], axis=1)
+    fir_bank = slab.Filter(taps, samplerate=sound.samplerate)
+    expected = numpy.stack([scipy.signal.filtfilt(taps[:, i], [1], sound.data[:, 0]) for i in range(3)], axis=1)
+    numpy.testing.assert_allclose(fir_bank.apply(sound).data, expected, atol=1e-12)
+
+
+def test_gain_cache():
+    slab.Filter.clear_gain_cache()
+    sound = slab.Sound.whitenoise(duration=0.5)
+    lowpass = slab.Filter.band(frequency=1000, kind='lp', fir=False)
+    first = lowpass.apply(sound)
+    second = lowpass.apply(sound)
+    numpy.testing.assert_array_equal(first.data, second.data)
+    info = slab.Filter.gain_cache_info()
+    assert info['hits'] == 1 and info['misses'] == 1 and info['size'] == 1
+    lowpass[:] = 1  # changing the filter invalidates the cached gains
+    numpy.testing.assert_allclose(lowpass.apply(sound).data, sound.data, atol=1e-12)
+    lowpass.data = lowpass.data * 0
+    assert not lowpass.apply(sound).data.any()
+    with pytest.raises(ValueError):  # the data of filters with cached results cannot be changed directly
+        lowpass.data[:] = 1
+    lowpass.data = numpy.ones_like(lowpass.data)
+    numpy.testing.assert_allclose(lowpass.apply(sound).data, sound.data, atol=1e-12)
+    info = slab.Filter.gain_cache_info()
+    assert info['misses'] == 3 and info['hits'] == 2  # the gains of all ones were already cached
+    copied = slab.Filter.band(frequency=1000, kind='lp', fir=False)
+    copied.apply(sound)  # filters with the same contents share the cached gains
+    assert slab.Filter.gain_cache_info()['hits'] == 3
+    gains = numpy.ones((100, 2))
+    view = slab.Filter(gains[:, :1], fir=False, copy=False)  # a view of writable memory is hashed on every call
+    view.apply(sound)
+    gains[:] = 0
+    assert not view.apply(sound).data.any()
+    slab.Filter.clear_gain_cache()
+    assert slab.Filter.gain_cache_info()['size'] == 0
+
+
+def test_cos_filterbank():
+    fbank = slab.Filter.cos_filterbank(length=1000, bandwidth=1/5, pass_bands=True, samplerate=8000)
+    numpy.testing.assert_allclose((fbank.data**2).sum(axis=1), 1)  # the squared filters add up to one
+    again = slab.Filter.cos_filterbank(length=1000, bandwidth=1/5, pass_bands=True, samplerate=8000)
+    again.data[:, 0] = 0  # each bank has its own copy of the cached gains
+    assert fbank.data[:, 0].any() and not again.data[:, 0].any()
+    fbank.data *= 2
+    cached = slab.Filter.cos_filterbank(length=1000, bandwidth=1/5, pass_bands=True, samplerate=8000)
+    numpy.testing.assert_array_equal(fbank.data, cached.data * 2)
+
+
+def test_gammatone_filterbank():
+    fbank = slab.Filter.gammatone_filterbank(bandwidth=1/5, low_cutoff=100, samplerate=16000)
+    center_freqs = slab.Filter._erb2freq(slab.Filter._center_freqs(100, 8000, 1/5)[0])
+    assert fbank.iir and fbank.nfilters == len(center_freqs)
+    w, h = fbank.tf(nbins=2**14, show=False)
+    gains = h[numpy.searchsorted(w, center_freqs), numpy.arange(fbank.nfilters)]
+    numpy.testing.assert_allclose(gains, 0, atol=0.1)  # unit gain at the center frequencies (in dB)
+    sound = slab.Sound.whitenoise(duration=0.1, samplerate=16000)
+    streaming = slab.StreamingFilter(fbank, blocksize=256)
+    blocks = numpy.concatenate([streaming.process(sound.data[start:start + 300]) for start in range(0, 1600, 300)])
+    numpy.testing.assert_allclose(blocks, fbank.apply(sound, zero_phase=False).data, atol=1e-12)
+
+
+def test_streaming_filter():
+    sound = slab.Sound.whitenoise(duration=0.5, nchannels=2)
+    lowpass = slab.Filter.band(frequency=1000, kind='lp', length=1001)
+    streaming = slab.StreamingFilter(lowpass, nchannels=2, blocksize=256)
+    sizes = [100, 256, 1000, 7]  # blocks of any length, shorter and longer than the partitions
+    starts = numpy.cumsum([0] + sizes * 2)
+    blocks = [sound.data[start:stop] for start, stop in zip(starts[:-1], starts[1:])] + [sound.data[starts[-1]:]]
+    filtered = numpy.concatenate([streaming.process(block) for block in blocks])
+    expected = scipy.signal.lfilter(lowpass.data[:, 0], [1], sound.data, axis=0)
+    numpy.testing.assert_allclose(filtered, expected, atol=1e-12)
+    assert streaming.latency == 500 / sound.samplerate
+    sos = scipy.signal.butter(4, 1000, fs=sound.samplerate, output='sos')
+    streaming = slab.StreamingFilter(sos, nchannels=2)
+    filtered = numpy.concatenate([streaming.process(block) for block in blocks])
+    numpy.testing.assert_allclose(filtered, scipy.signal.sosfilt(sos, sound.data, axis=0), atol=1e-12)
+    bank = slab.Filter.gammatone_filterbank(bandwidth=1, low_cutoff=500, samplerate=sound.samplerate)
+    streaming = slab.StreamingFilter(bank, nchannels=1)
+    filtered = numpy.concatenate([streaming.process(block[:, :1]) for block in blocks])
+    numpy.testing.assert_allclose(filtered, bank.apply(sound.channel(0), zero_phase=False).data, atol=1e-12)
+
+
+def test_convolver():
+    slab.Filter.clear_gain_cache()
+    sound = slab.Sound.whitenoise(duration=1.0)
+    decay = numpy.exp(-numpy.arange(3000) / 500)[:, numpy.newaxis]
+    response = slab.Filter(numpy.random.randn(3000, 2) * decay, samplerate=sound.samplerate)  # two channels
+    expected = scipy.signal.fftconvolve(sound.data, response.data, axes=0)
+    convolved = slab.Convolver(response).apply(sound)
+    assert convolved.nchannels == 2
+    numpy.testing.assert_allclose(convolved.data, expected, atol=1e-10)
+    for partitions in (None, (64, 512)):  # uniform and non-uniform partitions
+        convolver = slab.Convolver(response, blocksize=256, partitions=partitions)
+        blocks = [convolver.process(sound.data[start:start + 300]) for start in range(0, sound.nsamples, 300)]
+        numpy.testing.assert_allclose(numpy.concatenate(blocks), expected[:sound.nsamples], atol=1e-10)
+    slab.Convolver(response, blocksize=256)  # reuses the cached spectra of the partitions
+    assert slab.Filter.gain_cache_info()['hits'] == 1
+
+
+def test_save_load():
+    filt = slab.Filter(numpy.random.randn(100, 3), samplerate=44100, dtype='float32')
+    filt.save(PATH / 'filter.flt')
+    loaded = slab.Filter.load(PATH / 'filter.flt')
+    assert isinstance(loaded.data, numpy.memmap) and loaded.data.dtype == numpy.float32 and loaded.fir
+    numpy.testing.assert_array_equal(loaded.data, filt.data)
+    slab.Filter.clear_gain_cache()
+    loaded.tf(show=False)
+    loaded.tf(show=False)  # the digest of the mapped data is computed once
+    assert slab.Filter.gain_cache_info()['hits'] == 1 and loaded._digest is not None
+    loaded *= 2  # changing a memory-mapped filter makes a copy
+    numpy.testing.assert_allclose(loaded.tf(show=False)[1], filt.tf(show=False)[1] + 20 * numpy.log10(2), atol=1e-4)
+    numpy.testing.assert_array_equal(slab.Filter.load(PATH / 'filter.flt', mmap=False).data, filt.data)
+    slab.Filter.load(PATH / 'filter.flt').save(PATH / 'filter.flt')  # saving a mapped filter over its own file
+    numpy.testing.assert_array_equal(slab.Filter.load(PATH / 'filter.flt').data, filt.data)
+    legacy = numpy.concatenate(([[44100.] * 3], [[0.] * 3], numpy.abs(filt.data)))  # .npy files of earlier versions
+    numpy.save(PATH / 'filter.npy', legacy)
+    loaded = slab.Filter.load(PATH / 'filter.npy')
+    assert not loaded.fir and loaded.samplerate == 44100
+    numpy.testing.assert_allclose(loaded.data, numpy.abs(filt.data))
+
+
 def test_equalization():
 
     sound = slab.Sound.pinknoise(samplerate=44100)
@@ -20,11 +217,62 @@ def test_equalization():
                                 gain=[1., 0.2, 1.1, 0.5, 1.0, 0.0], fs=sound.samplerate)
     recording = slab.Sound(scipy.signal.filtfilt(filt, 1, sound.data.flatten()), samplerate=44100)
     fbank = slab.Filter.equalizing_filterbank(sound, recording, low_cutoff=200, high_cutoff=16000)
-    fbank.save('/tmp/equalizing_filter.npy')
-    fbank = slab.Filter.load('/tmp/equalizing_filter.npy')
+    fbank.save(PATH / 'equalizing_filter.flt')
+    fbank = slab.Filter.load(PATH / 'equalizing_filter.flt')
     sound_filt = fbank.apply(sound)
     Z_filt, _ = sound_filt.spectrum(show=False)
     Z_sound, _ = sound.spectrum(show=False)
     Z_rec, _ = recording.spectrum(show=False)
     # The difference between spectra should be smaller after equalization
     assert numpy.abs(Z_sound-Z_filt).sum() < numpy.abs(Z_sound-Z_rec).sum()
+
+
+def test_equalizing_filterbank_batched():
+    sound = slab.Sound.pinknoise(duration=0.5, samplerate=44100)
+    recording = slab.Sound([slab.Filter.band(frequency=f, kind='lp', samplerate=44100).apply(sound)
+                            for f in (2000, 4000, 8000)])
+    nsamples = sound.nsamples
+    fbank = slab.Filter.equalizing_filterbank(sound, recording, low_cutoff=200, high_cutoff=16000)
+    assert fbank.nfilters == 3 and sound.nsamples == nsamples  # the inputs are not changed
+    for i in range(3):  # same filters as for each channel on its own
+        single = slab.Filter.equalizing_filterbank(sound, recording.channel(i), low_cutoff=200, high_cutoff=16000)
+        numpy.testing.assert_allclose(fbank.channel(i).data, single.data, atol=1e-12)
+    bank = slab.Filter.cos_filterbank(length=1000, bandwidth=1/8, low_cutoff=200, high_cutoff=16000, samplerate=44100)
+    levels = bank.band_levels(sound)
+    numpy.testing.assert_allclose(levels[:, 0] + slab.sound._calibration_intensity, bank.apply(sound).level)
+    reused = slab.Filter.equalizing_filterbank(levels, recording, low_cutoff=200, high_cutoff=16000, filter_bank=bank)
+    numpy.testing.assert_allclose(reused.data, fbank.data)
+    freqs = [0, 200, 1000, 5000, 22050]  # the batched design matches scipy.signal.firwin2 for each filter
+    gains = numpy.random.uniform(0, 2, (len(freqs), 3))
+    gains[-1] = 0  # like in equalizing_filterbank (filters with an even number of taps need zero gain at Nyquist)
+    for length in (1000, 1001):
+        taps = slab.filter._firwin2_columns(length, freqs, gains, 44100)
+        for i in range(3):
+            expected = scipy.signal.firwin2(length, freqs, gains[:, i], fs=44100)
+            numpy.testing.assert_allclose(taps[:, i], expected, atol=1e-14)
+    for bad_freqs in ([0, 200, 1000, 5000], [0, 200, 1000, 22050, 22050], [0, 1000, 200, 5000, 22050],
+                      [0, 200, 200, 200, 22050], [0, 0, 1000, 5000, 22050], [0, 200, 1000, 5000, 30000]):
+        with pytest.raises(ValueError):  # inputs that scipy.signal.firwin2 rejects
+            slab.filter._firwin2_columns(1001, bad_freqs, gains, 44100)
+    gains[-1, 1] = 1  # filters with an even number of taps need zero gain at Nyquist
+    with pytest.raises(ValueError):
+        slab.filter._firwin2_columns(1000, freqs, gains, 44100)
+    slab.filter._firwin2_columns(1001, freqs, gains, 44100)
+
+
+def test_minimum_phase():
+    filt = slab.Filter.band(frequency=[500, 4000], kind='bp', samplerate=44100, length=1001)
+    minimum, error = filt.minimum_phase()
+    assert minimum.ntaps == filt.ntaps and error[0] < 0.001
+    _, h_filt = filt.tf(show=False)
+    _, h_minimum = minimum.tf(show=False)
+    in_band = h_filt[:, 0] > -20  # magnitudes in dB
+    numpy.testing.assert_allclose(h_minimum[in_band], h_filt[in_band], atol=0.1)
+    # the energy is at the start of the filter
+    energy = numpy.cumsum(minimum.data[:, 0]**2)
+    assert energy[filt.ntaps // 4] > 0.99 * energy[-1]
+    short, short_error = filt.minimum_phase(energy=0.999)
+    assert short.ntaps < filt.ntaps // 2 and error[0] < short_error[0] < 0.05
+    assert filt.minimum_phase(ntaps=100)[0].ntaps == 100
+    with pytest.raises(ValueError):
+        slab.Filter.band(frequency=1000, kind='lp', fir=False).minimum_phase()
@@ -1,5 +1,11 @@
 import slab
 import numpy
+import pytest
+import scipy.signal
+import tempfile
+from pathlib import Path
+DIR = tempfile.TemporaryDirectory()
+PATH = Path(DIR.name)
 
 
 def test_properties():
@@ -29,6 +35,7 @@ def test_vowel():
     vowel.spectrum(low=100, high=4000, log_power=True, show=False)
     vowel.waveform(start=0, end=.1, show=False)
     vowel.cochleagram(show=False)
+    assert vowel.cochleagram(show=False, filterbank='gammatone').shape[0] == vowel.nsamples
     vowel.vocode()
 
 
@@ -39,6 +46,29 @@ def test_noise():
     sound = slab.Sound.whitenoise(normalise=True)
     assert max(sound) <= 1
     assert min(sound) >= -1
+    for duration in (997, 1024):
+        assert slab.Sound.powerlawnoise(duration, nchannels=2).data.shape == (duration, 2)
+        assert slab.Sound.irn(duration=duration).nsamples == duration
+    # the power spectrum falls with 1/f**alpha also at lengths that are not fast (10007 is prime)
+    freqs = numpy.fft.rfftfreq(10007, d=1/10007)[1:]
+    for alpha in (1, 3):
+        noise = slab.Sound.powerlawnoise(10007, alpha, samplerate=10007, nchannels=8, normalise=False)
+        power = numpy.abs(numpy.fft.rfft(noise.data, axis=0)[1:])**2
+        slope = numpy.polyfit(numpy.log10(freqs), numpy.log10(power).mean(axis=1), 1)[0]
+        assert slope == pytest.approx(-alpha, abs=0.05)
+
+
+def test_fft_workers():
+    sound = slab.Sound.whitenoise(duration=997, nchannels=4)
+    filt = slab.Filter.band(frequency=1000, kind='lp', fir=False, samplerate=sound.samplerate)
+    Z, _ = sound.spectrum(show=False)
+    filtered = filt.apply(sound)
+    slab.Signal.set_fft_workers(2)
+    try:
+        numpy.testing.assert_allclose(sound.spectrum(show=False)[0], Z)
+        numpy.testing.assert_allclose(filt.apply(sound).data, filtered.data)
+    finally:
+        slab.Signal.set_fft_workers(None)
 
 
 def test_manipulations():
@@ -52,3 +82,228 @@ def test_manipulations():
         sound.spectral_feature(feature=feat)
     sound.crest_factor()
     sound.onset_slope()
+
+
+def test_arithmetic():
+    sound = slab.Sound.whitenoise(nchannels=2)
+    data = sound.data
+    doubled = sound + sound
+    assert doubled.data is not data
+    numpy.testing.assert_allclose(doubled.data, data * 2)
+    numpy.testing.assert_allclose((-sound).data, -data)
+    sound += sound
+    sound *= 0.5
+    sound -= 1
+    sound /= 2
+    assert sound.data is data  # in-place operators do not reallocate
+    numpy.testing.assert_allclose(sound.data, (doubled.data * 0.5 - 1) / 2)
+    mono = slab.Sound.whitenoise()
+    mono += slab.Sound.whitenoise(nchannels=2)  # result does not fit, falls back to a new array
+    assert mono.nchannels == 2
+    frames = list(sound.frames(duration=256))
+    assert frames[0] is not frames[1]
+    numpy.testing.assert_allclose(sound.data, (doubled.data * 0.5 - 1) / 2)
+
+
+def test_dtype():
+    slab.Signal.set_default_dtype('float32')
+    try:
+        sound = slab.Sound.pinknoise(samplerate=44100)
+        assert sound.data.dtype == numpy.float32
+        filt = slab.Filter.band(frequency=(500, 1000), kind='bp', fir=False, samplerate=44100)
+        filtered = filt.apply(sound)
+        assert filtered.data.dtype == numpy.float32
+        reference = filt.apply(sound.astype('float64'))
+        assert reference.data.dtype == numpy.float64
+        rms = numpy.sqrt(numpy.mean(reference.data**2))
+        assert numpy.abs(filtered.data - reference.data).max() < 1e-5 * rms
+        assert abs(filtered.level - reference.level) < 1e-4
+        lowpass = slab.Filter.band(frequency=50, kind='lp', iir='butter', samplerate=44100)
+        assert lowpass.data.dtype == numpy.float64  # IIR coefficients are not rounded to float32
+        assert slab.Filter.gammatone_filterbank(samplerate=44100).data.dtype == numpy.float64
+    finally:
+        slab.Signal.set_default_dtype('float64')
+    assert slab.Sound.whitenoise().data.dtype == numpy.float64
+    assert slab.Sound.whitenoise().astype('float32').data.dtype == numpy.float32
+
+
+def test_views():
+    data = numpy.random.randn(1000, 4)
+    sound = slab.Sound.from_array(data, samplerate=8000)
+    assert sound.data is data
+    assert slab.Sound(data).data is not data
+    channel = sound.channel(2)
+    assert numpy.shares_memory(channel.data, data)
+    assert channel.nchannels == 1
+    levels = sound.level
+    numpy.testing.assert_allclose(levels, [chan.level for chan in sound.channels()])
+    channel.data *= 0
+    assert not data[:, 2].any()
+    mono = slab.Sound.from_array(numpy.ones(100, dtype='float32'), samplerate=100)
+    assert mono.data.dtype == numpy.float32 and mono.nchannels == 1
+
+
+def test_memmap():
+    sound = slab.Sound.pinknoise(nchannels=2, samplerate=44100)
+    sound.write(PATH / 'float.wav', normalise=False, subtype='FLOAT')
+    mapped = slab.Sound.read(PATH / 'float.wav', mmap=True)
+    assert isinstance(mapped.data, numpy.memmap)
+    assert mapped.samplerate == 44100 and mapped.nchannels == 2
+    with pytest.raises(ValueError):
+        slab.Sound.read(PATH / 'float.wav', dtype='float64', mmap=True)
+    numpy.testing.assert_allclose(mapped[100:200], sound[100:200], atol=1e-6)
+    numpy.testing.assert_allclose(mapped.level, sound.level, atol=1e-4)
+    numpy.save(PATH / 'sound.npy', sound.data)
+    mapped = slab.Sound.memmap(PATH / 'sound.npy', samplerate=44100)
+    filt = slab.Filter.band(frequency=1000, kind='lp', samplerate=44100)
+    numpy.testing.assert_allclose(filt.apply(mapped).data, filt.apply(sound).data)
+    fft_filt = slab.Filter.band(frequency=1000, kind='lp', samplerate=44100, fir=False)
+    numpy.testing.assert_allclose(fft_filt.apply(mapped).data, fft_filt.apply(sound).data)
+    bank = slab.Filter.cos_filterbank(samplerate=44100)
+    numpy.testing.assert_allclose(bank.apply(mapped.channel(0)).data, bank.apply(sound.channel(0)).data)
+    Z, freqs = mapped.spectrum(show=False)
+    expected_Z, expected_freqs = sound.spectrum(show=False)
+    numpy.testing.assert_allclose(Z, expected_Z)
+    numpy.testing.assert_array_equal(freqs, expected_freqs)
+    _ = list(mapped.frames())
+
+
+def test_resample():
+    sound = slab.Sound.whitenoise(nchannels=2, samplerate=44100)
+    resampled = sound.resample(48000)
+    assert resampled.samplerate == 48000
+    assert resampled.nsamples == 48000
+    resampler = slab.Resampler(44100, 48000, nchannels=2)
+    blocks = [resampler.process(sound[i:i+1000]) for i in range(0, sound.nsamples, 1000)]
+    blocks.append(resampler.flush())
+    numpy.testing.assert_allclose(numpy.concatenate(blocks), resampled.data, atol=1e-12)
+
+
+def test_delay():
+    for nsamples in (500, 20000):
+        sound = slab.Sound.tone(frequency=500, duration=nsamples, samplerate=8000, nchannels=3)
+        original = sound.data.copy()
+        sound.delay(duration=[3, -3, 2.5 / sound.samplerate], channel=[0, 1, 2])
+        numpy.testing.assert_array_equal(sound.data[3:, 0], original[:-3, 0])
+        numpy.testing.assert_array_equal(sound.data[:-3, 1], original[3:, 1])
+        assert not sound.data[:3, 0].any() and not sound.data[-3:, 1].any()
+        expected = numpy.sin(2 * numpy.pi * 500 * (sound.times - 2.5 / sound.samplerate))
+        numpy.testing.assert_allclose(sound.data[200:-200, 2], expected[200:-200], atol=1e-3)
+
+
+def test_dynamic_delay():
+    sound = slab.Sound.tone(frequency=500, duration=8000, samplerate=8000)
+    delays = numpy.full(sound.nsamples, 2.5 / sound.samplerate)
+    original = sound.data.copy()
+    sound.delay(duration=delays, filter_length=512)
+    expected = numpy.sin(2 * numpy.pi * 500 * (sound.times - 3.5 / sound.samplerate))
+    numpy.testing.assert_allclose(sound.data[1000:7000, 0], expected[1000:7000], atol=1e-3)
+    assert delays[0] == 2.5 / sound.samplerate  # the delays are not modified
+    sound.data[:] = original
+    sound.delay(duration=numpy.zeros(sound.nsamples))
+    numpy.testing.assert_array_equal(sound.data, original)
+    moving = slab.Binaural.whitenoise(duration=1.0, samplerate=44100).itd_ramp(-6e-4, 6e-4)
+    assert moving.nsamples == 44100
+
+
+def test_envelope():
+    sound = slab.Sound.tone(frequency=1000, duration=1.0, samplerate=44100, nchannels=2)
+    sound = sound * slab.Sound.tone(frequency=4, duration=1.0, samplerate=44100)
+    envelope = sound.envelope()
+    filt = scipy.signal.firwin(1000, 50, pass_zero=True, fs=sound.samplerate)
+    expected = scipy.signal.filtfilt(filt, [1], numpy.abs(scipy.signal.hilbert(sound.data, axis=0)), axis=0)
+    numpy.testing.assert_allclose(envelope.data, expected, atol=1e-6)
+    assert slab.Sound.tone(duration=500).envelope().nsamples == 500
+    odd = slab.Sound.pinknoise(duration=44111, samplerate=44100)  # a prime number of samples
+    expected = scipy.signal.filtfilt(filt, [1], numpy.abs(scipy.signal.hilbert(odd.data, axis=0)), axis=0)
+    numpy.testing.assert_allclose(odd.envelope().data, expected, atol=1e-6)
+    follower = slab.EnvelopeFollower(sound.samplerate, nchannels=2)
+    streamed = numpy.concatenate([follower.process(sound[i:i+4096]) for i in range(0, sound.nsamples, 4096)])
+    lag = int(numpy.rint(follower.latency * sound.samplerate))
+    numpy.testing.assert_allclose(streamed[lag+5000:-5000], envelope.data[5000:-lag-5000], atol=0.05)
+
+
+def test_batch():
+    sounds = [slab.Sound.pinknoise(duration=0.5, nchannels=2) for _ in range(5)]
+    batch = slab.SoundBatch(sounds)
+    assert batch.nitems == 5 and batch.nsamples == sounds[0].nsamples and batch.nchannels == 2
+    numpy.testing.assert_allclose(batch.level, [sound.level for sound in sounds])
+    batch.level = [60, 61, 62, 63, 64]
+    numpy.testing.assert_allclose(batch[3].level, 63)
+    batch[3].level = 70  # items are views of the batch
+    numpy.testing.assert_allclose(batch.level[3], 70)
+    numpy.testing.assert_allclose(batch.ramp()[1].data, batch[1].ramp().data)
+    for fir in (True, False):
+        filt = slab.Filter.band(frequency=1000, kind='lp', fir=fir)
+        numpy.testing.assert_allclose(filt.apply(batch)[2].data, filt.apply(batch[2]).data)
+    numpy.testing.assert_allclose(batch.envelope()[4].data, batch[4].envelope().data)
+    spectra, freqs = batch.spectrum()
+    numpy.testing.assert_allclose(spectra[0], batch[0].spectrum(show=False)[0])
+    assert all(isinstance(sound, slab.Sound) for sound in batch.to_list())
+    binaural = slab.SoundBatch([slab.Binaural.whitenoise(duration=0.1) for _ in range(2)])
+    assert isinstance(binaural[0], slab.Binaural)
+    single = slab.SoundBatch([sound.astype('float32') for sound in sounds])  # keeps the type of the sounds
+    assert single.data.dtype == numpy.float32
+
+
+def test_lazy():
+    sound = slab.Sound.pinknoise(duration=2.0, nchannels=2)
+    eager = sound.ramp().filter(frequency=500, kind='lp').am()
+    eager.level = 70
+    lazy = sound.lazy().ramp().filter(frequency=500, kind='lp').am()
+    lazy.level = 70
+    result = lazy.compute()
+    assert isinstance(result, slab.Sound) and result.nsamples == sound.nsamples
+    numpy.testing.assert_allclose(result.level, 70)
+    numpy.testing.assert_allclose(result.data[2000:-2000], eager.data[2000:-2000], atol=1e-4)
+    filt = slab.Filter.band(frequency=1000, kind='lp', fir=False)
+    numpy.testing.assert_allclose((sound.lazy() * 2).apply_filter(filt).data, filt.apply(sound * 2).data, atol=1e-12)
+    numpy.testing.assert_array_equal(sound.lazy().data, sound.data)
+    short = slab.Sound.whitenoise(duration=201, samplerate=8000)  # shorter than the filter
+    long_filt = slab.Filter.band(frequency=500, kind='lp', length=1000, samplerate=8000)
+    freqs = numpy.fft.rfftfreq(short.nsamples, d=1/8000)
+    response = numpy.abs(scipy.signal.freqz(long_filt.data[:, 0], worN=freqs, fs=8000)[1])**2
+    expected = numpy.fft.irfft(numpy.fft.rfft(short.data[:, 0]) * response, short.nsamples)
+    numpy.testing.assert_allclose(short.lazy().apply_filter(long_filt).data[:, 0], expected, atol=1e-12)
+
+
+def test_stream():
+    sound = slab.Sound.pinknoise(duration=1.0, samplerate=44100, nchannels=2)
+    stream = slab.StreamSignal.from_sound(sound, blocksize=5000)
+    numpy.testing.assert_allclose(stream.level, sound.level)
+    stream.level = 70
+    numpy.testing.assert_allclose(stream.level, 70)
+    gain = 10**((70 - sound.level) / 20)
+    numpy.testing.assert_allclose(stream.ramp().to_sound().data, (sound * gain).ramp().data)
+    numpy.testing.assert_allclose(stream.resample(48000).to_sound().data, (sound * gain).resample(48000).data,
+                                  atol=1e-12)
+    filt = slab.Filter.band(frequency=1000, kind='lp', samplerate=44100)
+    filtered = slab.StreamSignal.from_sound(sound, blocksize=5000).apply_filter(filt)
+    lag = int(numpy.rint(filtered.latency * sound.samplerate))
+    interior = slice(lag + 5000, -5000)  # filtfilt pads the edges, the stream starts from silence
+    numpy.testing.assert_allclose(filtered.to_sound().data[interior], filt.apply(sound).data[5000:-lag-5000],
+                                  atol=1e-10)
+    stream.write(PATH / 'stream.wav', subtype='FLOAT')
+    read = slab.StreamSignal.read(PATH / 'stream.wav', blocksize=3000)
+    assert read.nsamples == sound.nsamples and read.samplerate == 44100
+    numpy.testing.assert_allclose(read.to_sound().data, (sound * gain).data, atol=1e-6)
+
+
+def test_buffer():
+    sound1 = slab.Sound.whitenoise(duration=1.0)
+    sound2 = slab.Sound.whitenoise(duration=1.0)
+    buffer = slab.SoundBuffer(capacity=10)
+    buffer.extend([sound1, sound2])
+    assert buffer.nsamples == 16000 and buffer.capacity >= 16000
+    numpy.testing.assert_array_equal(buffer.to_sound().data, slab.Sound.sequence(sound1, sound2).data)
+    sound = buffer.to_sound()
+    buffer.append(sound1, ramp=0.01)  # must not change the returned sound
+    numpy.testing.assert_array_equal(sound.data, slab.Sound.sequence(sound1, sound2).data)
+    crossfaded = slab.Sound.crossfade(sound1, sound2, overlap=0.1)
+    expected = numpy.zeros((15200, 1))
+    expected[:8000] += sound1.ramp(when='offset', duration=0.1).data
+    expected[7200:] += sound2.ramp(when='onset', duration=0.1).data
+    numpy.testing.assert_allclose(crossfaded.data, expected)
+    assert sound1.nsamples == 8000  # the inputs are not changed
+    binaural = slab.Binaural.crossfade(slab.Binaural.whitenoise(), slab.Binaural.pinknoise(), overlap=0.1)
+    assert isinstance(binaural, slab.Binaural)